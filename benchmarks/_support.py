@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the benchmark scripts.
+
+Each script can run under :mod:`pyperf` (``--pyperf``, any remaining
+arguments are passed to :class:`pyperf.Runner`) or as a plain script
+that times each benchmark with :func:`timeit`-style loops, counts
+allocations with :mod:`tracemalloc` and writes machine readable JSON
+results (``--output``) for comparison between versions.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+import json
+import time
+import platform
+import argparse
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover Python 2
+    tracemalloc = None
+
+try:
+    from time import perf_counter as _timer
+except ImportError:  # pragma: no cover Python 2
+    _timer = time.time
+
+
+def setup_components():
+    """
+    Load the configuration of nti.coremetadata into the global
+    component registry.
+    """
+    from zope.component.hooks import setHooks
+    from zope.configuration import xmlconfig
+    import nti.coremetadata
+    setHooks()
+    xmlconfig.file('configure.zcml', package=nti.coremetadata)
+
+
+def _version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('nti.coremetadata').version
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def _allocations(func, setup):
+    if tracemalloc is None:
+        return None
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        func()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return {
+        'blocks': sum(max(stat.count_diff, 0) for stat in stats),
+        'bytes': sum(max(stat.size_diff, 0) for stat in stats),
+        'peak_bytes': peak,
+    }
+
+
+def _time(func, setup, loops, repeat):
+    # warm up
+    if setup is not None:
+        setup()
+    func()
+    timings = []
+    for _ in range(repeat):
+        total = 0.0
+        for _ in range(loops):
+            if setup is not None:
+                setup()
+            start = _timer()
+            func()
+            total += _timer() - start
+        timings.append(total / loops)
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    variance = sum((t - mean) ** 2 for t in timings) / len(timings)
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'mean': mean,
+        'stdev': variance ** 0.5,
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def run(benchmarks, description):
+    """
+    Run the benchmarks, a sequence of ``(name, func, setup)`` tuples.
+    ``setup`` is called before each (untimed) call of ``func``
+    and may be None.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--pyperf', action='store_true',
+                        help="Run the benchmarks under pyperf")
+    parser.add_argument('--output', '-o',
+                        help="Write the JSON results to this file")
+    parser.add_argument('--loops', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', '-k', default='',
+                        help="Only run benchmarks containing this text")
+    args, rest = parser.parse_known_args()
+    benchmarks = [b for b in benchmarks if args.filter in b[0]]
+
+    if args.pyperf:
+        import pyperf
+        sys.argv[1:] = rest
+
+        def _timed(func, setup):
+            def bench(loops):
+                total = 0.0
+                for _ in range(loops):
+                    if setup is not None:
+                        setup()
+                    start = pyperf.perf_counter()
+                    func()
+                    total += pyperf.perf_counter() - start
+                return total
+            return bench
+        runner = pyperf.Runner()
+        for name, func, setup in benchmarks:
+            runner.bench_time_func(name, _timed(func, setup))
+        return None
+
+    results = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'version': _version(),
+        'benchmarks': {},
+    }
+    for name, func, setup in benchmarks:
+        result = _time(func, setup, args.loops, args.repeat)
+        result['allocations'] = _allocations(func, setup)
+        results['benchmarks'][name] = result
+        print("%-50s %10.1f us" % (name, result['median'] * 1e6))
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    return results
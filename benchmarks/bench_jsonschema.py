@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for building JSON schemas of the core interfaces.
+
+``cold`` benchmarks clear every schema cache first, like the first
+request in a new worker; ``warm`` benchmarks hit the caches;
+``walk`` benchmarks run :class:`.CoreJsonSchemafier` directly.
+
+Run ``python benchmarks/bench_jsonschema.py --help`` for options.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=inherit-non-class
+
+from _support import run
+from _support import setup_components
+
+from nti.coremetadata import jsonschema
+
+from nti.coremetadata.interfaces import IUser
+from nti.coremetadata.interfaces import ICommunity
+from nti.coremetadata.interfaces import IEmbeddedLink
+from nti.coremetadata.interfaces import IShareableModeledContent
+from nti.coremetadata.interfaces import IDynamicSharingTargetFriendsList
+
+from nti.coremetadata.schema import CompoundModeledContentBody
+
+from nti.coremetadata.utils import make_schema
+from nti.coremetadata.utils import clear_schema_cache
+from nti.coremetadata.utils import make_encoded_schema
+
+
+class INote(IShareableModeledContent):
+    """
+    A content type with a compound body.
+    """
+    body = CompoundModeledContentBody()
+
+
+SCHEMAS = (IUser, ICommunity, IEmbeddedLink,
+           IDynamicSharingTargetFriendsList, INote)
+
+
+def clear_caches():
+    clear_schema_cache()
+    jsonschema.clear_caches()
+    jsonschema._field_plans.clear()  # pylint: disable=protected-access
+
+
+def benchmarks():
+    result = []
+    for schema in SCHEMAS:
+        name = schema.__name__
+
+        def cold(schema=schema):
+            make_schema(schema)
+
+        def warm(schema=schema):
+            make_schema(schema)
+
+        def encoded(schema=schema):
+            make_encoded_schema(schema)
+
+        def walk(schema=schema):
+            jsonschema.CoreJsonSchemafier(schema).make_schema()
+
+        result.extend((
+            ('%s.cold' % name, cold, clear_caches),
+            ('%s.warm' % name, warm, None),
+            ('%s.encoded' % name, encoded, None),
+            ('%s.walk' % name, walk, None),
+        ))
+
+    def batch():
+        maker = jsonschema.DefaultObjectJsonSchemaMaker()
+        maker.make_schemas(SCHEMAS)
+    result.append(('all.batch.cold', batch, clear_caches))
+    return result
+
+
+def main():
+    setup_components()
+    return run(benchmarks(), __doc__)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for assigning through the field properties and data URI
+fields of :mod:`nti.coremetadata.schema`.
+
+Each benchmark is one assignment (or one batch, for ``set_many``),
+so the reported time and allocations are per operation. ``typical``
+bodies are already sanitized fragments; ``text`` and ``bytes`` bodies
+are plain and legacy strings that must be sanitized (``cold``: with an
+empty body part cache); ``adapted`` bodies fail validation before
+being adapted.
+
+Run ``python benchmarks/bench_schema.py --help`` for options.
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=inherit-non-class
+
+from base64 import b64encode
+
+from zope import interface
+
+from _support import run
+from _support import setup_components
+
+from nti.contentfragments.interfaces import UnicodeContentFragment
+from nti.contentfragments.interfaces import SanitizedHTMLContentFragment
+
+from nti.coremetadata.schema import DataURI
+from nti.coremetadata.schema import LazyDataURI
+from nti.coremetadata.schema import BodyFieldProperty
+from nti.coremetadata.schema import clear_body_part_cache
+from nti.coremetadata.schema import CompoundModeledContentBody
+from nti.coremetadata.schema import MessageInfoBodyFieldProperty
+
+#: The number of parts of large bodies
+LARGE = 1000
+
+#: The number of bodies assigned by the batch benchmarks
+BATCH = 100
+
+#: The size of the decoded payload of the data URIs
+PAYLOAD = 1024 * 1024
+
+
+class IWritten(interface.Interface):
+    body = CompoundModeledContentBody()
+
+
+class Note(object):
+    body = BodyFieldProperty(IWritten['body'])
+
+
+class Message(object):
+    body = MessageInfoBodyFieldProperty(IWritten['body'])
+
+
+class _Sink(object):
+
+    def write(self, data):
+        pass
+
+
+TEXTS = [u'<p>Part %d of the body</p>' % i for i in range(10)]
+
+FRAGMENTS = [SanitizedHTMLContentFragment(x) for x in TEXTS]
+
+DATA_URI = 'data:image/png;base64,' + b64encode(b'\x89PNG' * (PAYLOAD // 4)).decode('ascii')
+
+
+def _assign(factory, value):
+    obj = factory()
+
+    def bench():
+        # A new sequence each time, or we'd measure the identity fast path
+        obj.body = list(value)
+    return bench
+
+
+def benchmarks():
+    result = [
+        ('body.typical', _assign(Note, FRAGMENTS[:3]), None),
+        ('body.text', _assign(Note, TEXTS[:3]), None),
+        ('body.text.cold', _assign(Note, TEXTS[:3]), clear_body_part_cache),
+        ('body.bytes', _assign(Note, [x.encode('utf-8') for x in TEXTS[:3]]), None),
+        ('body.adapted', _assign(Note, [UnicodeContentFragment(x) for x in TEXTS[:3]]), None),
+        ('body.large.typical', _assign(Note, FRAGMENTS * (LARGE // 10)), None),
+        ('body.large.text', _assign(Note, TEXTS * (LARGE // 10)), None),
+        ('message.text', _assign(Message, TEXTS[:1]), None),
+        ('message.bytes', _assign(Message, [TEXTS[0].encode('utf-8')]), None),
+    ]
+
+    note = Note()
+
+    def stream():
+        note.body = (x for x in TEXTS * (LARGE // 10))
+    result.append(('body.large.stream', stream, None))
+
+    message = Message()
+
+    def message_single():
+        message.body = TEXTS[0].encode('utf-8')
+    result.append(('message.single.bytes', message_single, None))
+
+    notes = [Note() for _ in range(BATCH)]
+    bodies = [TEXTS[i % 10:i % 10 + 3] for i in range(BATCH)]
+    prop = Note.__dict__['body']
+
+    def batch():
+        prop.set_many(zip(notes, bodies))
+
+    def one_by_one():
+        for obj, body in zip(notes, bodies):
+            obj.body = body
+    result.append(('body.batch.set_many', batch, None))
+    result.append(('body.batch.assign', one_by_one, None))
+
+    data_uri = DataURI()
+    lazy_uri = LazyDataURI()
+
+    def datauri():
+        data_uri.fromUnicode(DATA_URI).data
+
+    def lazy():
+        lazy_uri.fromUnicode(DATA_URI)
+
+    def lazy_write():
+        lazy_uri.fromUnicode(DATA_URI).write_to(_Sink())
+    result.extend((
+        ('datauri.decode', datauri, None),
+        ('datauri.lazy.validate', lazy, None),
+        ('datauri.lazy.write_to', lazy_write, None),
+    ))
+    return result
+
+
+def main():
+    setup_components()
+    return run(benchmarks(), __doc__)
+
+
+if __name__ == '__main__':
+    main()
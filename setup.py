@@ -55,6 +55,7 @@ setup(
     tests_require=TESTS_REQUIRE,
     install_requires=[
         'setuptools',
+        'BTrees',
         'isodate',
         'nti.base',
         'nti.contentfragments',
@@ -63,6 +64,7 @@ setup(
         'nti.property',
         'nti.schema',
         'nti.zope_catalog',
+        'persistent',
         'six',
         'zope.annotation',
         'zope.component',
@@ -72,7 +74,9 @@ setup(
         'zope.event',
         'zope.i18n',
         'zope.i18nmessageid',
+        'zope.index',
         'zope.interface',
+        'zope.intid',
         'zope.lifecycleevent',
         'zope.location',
         'zope.mimetype',
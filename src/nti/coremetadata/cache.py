@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Small, thread-safe caching helpers.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import threading
+
+from collections import OrderedDict
+
+logger = __import__('logging').getLogger(__name__)
+
+#: Default maximum number of entries kept by an :class:`LRUCache`
+DEFAULT_CACHE_SIZE = 256
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts its least recently used entries.
+
+    All operations are guarded by a lock so a single instance can be
+    shared between threads. Hits and misses are counted and
+    reported by :meth:`stats`.
+
+    If a *maxweight* is given, the entries are also evicted to keep
+    the sum of their weights (as passed to :meth:`set`, for example
+    their approximate size in bytes) below it. Entries heavier than
+    *maxweight* are not stored.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, maxweight=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        if maxweight is not None and maxweight < 1:
+            raise ValueError("maxweight must be positive")
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weight = 0
+        self.hits = self.misses = self.evictions = 0
+        self._data = OrderedDict()
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                # pop and re-insert to move the key to the MRU end
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def _pop(self, key):
+        value = self._data.pop(key)
+        self.weight -= self._weights.pop(key, 0)
+        return value
+
+    def set(self, key, value, weight=0):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.maxweight is not None and weight > self.maxweight:
+                return value
+            self._data[key] = value
+            if weight:
+                self._weights[key] = weight
+                self.weight += weight
+            while     len(self._data) > self.maxsize \
+                  or (self.maxweight is not None and self.weight > self.maxweight):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                return self._pop(key)
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """
+        Return a dictionary describing the usage of this cache.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'weight': self.weight,
+            'maxweight': self.maxweight,
+        }
+
+
+class IdentityCache(LRUCache):
+    """
+    An :class:`LRUCache` keyed by the identity of some objects (such as
+    interfaces, which compare by name, or fields) and, optionally, a
+    hashable *extra* key.
+
+    Each entry holds its objects, so their ids are not reused while it
+    is cached, and lookups check that they are the same objects.
+    """
+
+    @staticmethod
+    def _key(objects, extra):
+        return (tuple(id(x) for x in objects), extra)
+
+    def lookup(self, objects, extra=None, default=None):
+        """
+        Return the value stored for the objects and extra key, or
+        *default*.
+        """
+        entry = self.get(self._key(objects, extra))
+        if entry is None:
+            return default
+        if any(x is not y for x, y in zip(entry[0], objects)):
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return default
+        return entry[1]
+
+    def store(self, objects, value, extra=None, weight=0):
+        """
+        Store the value for the objects and extra key, returning it.
+        """
+        self.set(self._key(objects, extra), (tuple(objects), value), weight)
+        return value
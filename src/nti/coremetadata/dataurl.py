@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Data URLs whose payload is only decoded when needed.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import re
+import binascii
+
+from six.moves.urllib_parse import unquote
+from six.moves.urllib_parse import unquote_to_bytes
+
+from nti.property.dataurl import DataURL
+
+#: The number of base64 characters decoded at a time when streaming
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+#: Matches the header of a data URL, up to and including the comma
+#: that starts its payload. The payload is not checked.
+DATA_HEADER = re.compile(r'data:(?P<metadata>[^,\s]*),')
+
+# Characters base64 decoding ignores, such as the line breaks of MIME
+# encoded payloads
+_NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+_DEFAULT_MIME_TYPE = 'text/plain;charset=US-ASCII'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def is_data_header(value):
+    """
+    Return whether the string starts with a valid data URL header.
+    """
+    return DATA_HEADER.match(value) is not None
+
+
+class LazyDataURL(DataURL):
+    """
+    A :class:`nti.property.dataurl.DataURL` that parses its header,
+    not its payload, to find the mime type, and decodes its payload
+    on first access of :attr:`payload` or :attr:`data`.
+
+    Use :meth:`write_to` or :meth:`iter_decoded` to decode a large
+    payload in chunks without holding all of it in memory.
+    """
+
+    def __getstate__(self):
+        # Never pickle the decoded payload
+        return {k: v for k, v in self.__dict__.items()
+                if not k.startswith('_v_')}
+
+    def _header(self):
+        try:
+            return self.__dict__['_v_header']
+        except KeyError:
+            pass
+        match = DATA_HEADER.match(self)
+        if match is None:
+            raise ValueError("Not a data URL")
+        parts = match.group('metadata').rsplit(';', 1)
+        base64 = parts[-1] == 'base64'
+        if base64:
+            parts = parts[:-1]
+        mime_type = parts[0] if parts and parts[0] else _DEFAULT_MIME_TYPE
+        result = self.__dict__['_v_header'] = (mime_type, base64, match.end())
+        return result
+
+    @property
+    def mimeType(self):
+        return self._header()[0]
+
+    @property
+    def is_base64(self):
+        return self._header()[1]
+
+    def _chunks(self, chunk_size):
+        _, base64, start = self._header()
+        if not base64:
+            yield unquote_to_bytes(self[start:])
+            return
+        encoded = self
+        if _NOT_BASE64.search(self, start) is not None:
+            # Ignored characters would misalign the chunks
+            encoded = _NOT_BASE64.sub('', self[start:])
+            start = 0
+        chunk_size -= chunk_size % 4  # keep base64 quanta whole
+        for i in range(start, len(encoded), chunk_size):
+            yield binascii.a2b_base64(encoded[i:i + chunk_size])
+
+    def iter_decoded(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Iterate the decoded payload in chunks of about three quarters of
+        *chunk_size* bytes.
+        """
+        data = self.__dict__.get('_v_data')
+        if data is not None:
+            view = memoryview(data)
+            for i in range(0, len(view), chunk_size):
+                yield view[i:i + chunk_size]
+        else:
+            for chunk in self._chunks(max(chunk_size, 4)):
+                yield chunk
+
+    def write_to(self, fp, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Write the decoded payload to the file-like object,
+        a chunk at a time.
+
+        :return: The number of bytes written.
+        """
+        count = 0
+        for chunk in self.iter_decoded(chunk_size):
+            fp.write(chunk)
+            count += len(chunk)
+        return count
+
+    def _bytes(self):
+        data = self.__dict__.get('_v_data')
+        if data is None:
+            data = b''.join(self._chunks(DEFAULT_CHUNK_SIZE))
+            self.__dict__['_v_data'] = data
+        return data
+
+    @property
+    def data(self):
+        # Like DataURL, text unless the payload is base64 encoded
+        if not self.is_base64:
+            return unquote(self[self._header()[2]:])
+        return self._bytes()
+
+    @property
+    def payload(self):
+        """
+        A :class:`memoryview` of the decoded payload bytes, sharing
+        their memory.
+        """
+        return memoryview(self._bytes())
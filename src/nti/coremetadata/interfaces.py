@@ -370,6 +370,12 @@ class IMentionable(interface.Interface):
         :return:
         """
 
+    def filterMentionedDirectly(users):
+        """
+        Return a list of the users (or usernames) of the iterable that
+        are mentioned directly in this object, in their original order.
+        """
+
 # content types
 
 
@@ -1164,6 +1170,12 @@ class IContextLastSeenContainer(IEnumerableMapping, INoAutoIndexEver):
 class IObjectJsonSchemaMaker(interface.Interface):
     """
     Marker interface for an object Json Schema maker utility
+
+    Makers may also have a ``make_schemas(schemas, user=None)`` method
+    that creates the JSON schemas of several zope schemas at once,
+    returning a mapping from each schema to its JSON schema. Use
+    :func:`nti.coremetadata.utils.make_schemas`, which falls back to
+    :meth:`make_schema` for makers without one.
     """
 
     def make_schema(schema, user=None):
@@ -1174,6 +1186,34 @@ class IObjectJsonSchemaMaker(interface.Interface):
         :param user The user (optional)
         """
 
+
+class ISchemaTimingSink(interface.Interface):
+    """
+    Receives the timings of the phases of JSON schema generation.
+    See :mod:`nti.coremetadata.timing`.
+    """
+
+    def record(phase, name, elapsed):
+        """
+        Record that a phase for the named field took ``elapsed`` seconds.
+        """
+
+
+class IObjectJsonSchemaUserOverlay(interface.Interface):
+    """
+    A subscriber adapting a user that customizes the JSON schemas made
+    for that user, for example to make fields readonly based on the
+    user's permissions.
+    """
+
+    def overrides(schema):
+        """
+        Return a mapping from field names to a mapping of the values to
+        replace in the schema of that field, or to None to hide the field.
+
+        :param schema The zope schema.
+        """
+
 # context objects
 
 
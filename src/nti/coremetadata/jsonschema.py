@@ -8,8 +8,19 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import json
+import hashlib
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # pragma: no cover Python 2
+    from collections import MutableMapping
+
+from zope import component
 from zope import interface
 
+from zope.interface.interfaces import IMethod
+
 from zope.schema.interfaces import IList
 from zope.schema.interfaces import IChoice
 from zope.schema.interfaces import IObject
@@ -20,7 +31,12 @@ from nti.base.interfaces import ICreated
 from nti.base.interfaces import ICreatedTime
 from nti.base.interfaces import ILastModified
 
+from nti.coremetadata.cache import IdentityCache
+
 from nti.coremetadata.interfaces import IObjectJsonSchemaMaker
+from nti.coremetadata.interfaces import IObjectJsonSchemaUserOverlay
+
+from nti.coremetadata.timing import timed_schemafier
 
 from nti.schema.interfaces import IVariant
 from nti.schema.interfaces import IListOrTuple
@@ -37,11 +53,177 @@ FIELDS = u'Fields'
 logger = __import__('logging').getLogger(__name__)
 
 
+class FieldPlan(object):
+    """
+    The precomputed top-level fields of a schema and the names a
+    schemafier allows from them.
+    """
+
+    __slots__ = ('schema', 'fields', 'allowed', 'field_names')
+
+    def __init__(self, schema, fields, allowed):
+        self.schema = schema
+        self.fields = fields
+        self.allowed = allowed
+        # What ends up in the JSON schema; methods are never included
+        self.field_names = frozenset(
+            name for name in allowed if not IMethod.providedBy(fields[name])
+        )
+
+    def __contains__(self, name):
+        return name in self.allowed
+
+
+class LazyFieldSchemas(MutableMapping):
+    """
+    A mapping from the field names of a schema to their JSON schemas,
+    computing each field schema the first time it is accessed.
+
+    Items may be replaced or deleted, which doesn't compute anything.
+    """
+
+    def __init__(self, schemafier):
+        self._schemafier = schemafier
+        self._plan = schemafier.field_plan
+        self._names = self._plan.field_names
+        self._computed = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._computed[name]
+        except KeyError:
+            pass
+        if name not in self._names:
+            raise KeyError(name)
+        field = self._plan.fields[name]
+        # pylint: disable=protected-access
+        item_schema = self._schemafier._make_field_schema(field, name)
+        self._schemafier.post_process_field(name, field, item_schema)
+        self._computed[name] = item_schema
+        return item_schema
+
+    def _mutable_names(self):
+        if isinstance(self._names, frozenset):
+            self._names = set(self._names)
+        return self._names
+
+    def __setitem__(self, name, value):
+        self._mutable_names().add(name)
+        self._computed[name] = value
+
+    def __delitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        self._mutable_names().discard(name)
+        self._computed.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+#: Field plans by schemafier class and schema
+_field_plans = IdentityCache(1024)
+
+
+def get_field_plan(schema, factory):
+    """
+    Return the :class:`FieldPlan` for the given schema as seen by the
+    given schemafier class. Interfaces do not change after they are
+    defined, so plans are computed once and shared.
+    """
+    result = _field_plans.lookup((schema, factory))
+    if result is None:
+        schemafier = factory(schema)
+        fields = dict(schema.namesAndDescriptions(all=True))
+        allowed = frozenset(
+            name for name, field in fields.items()
+            if schemafier.check_field(name, field)
+        )
+        result = _field_plans.store((schema, factory),
+                                    FieldPlan(schema, fields, allowed))
+    return result
+
+
+_marker = object()
+
+#: Encoded schemas by maker and schema
+_encoded_schemas = IdentityCache(512)
+
+#: UI types of object schemas
+_object_types = IdentityCache(1024)
+
+#: Base types of variant fields by schemafier class, field and type
+_variant_types = IdentityCache(1024)
+
+
+def get_object_ui_type(schema):
+    """
+    Return the UI type used for fields holding objects of
+    the given schema.
+    """
+    result = _object_types.lookup((schema,), default=_marker)
+    if result is _marker:
+        result = schema.queryTaggedValue('_ext_mime_type') \
+            or get_ui_type_from_field_interface(schema) \
+            or get_ui_type_from_interface(schema)
+        _object_types.store((schema,), result)
+    return result
+
+
+def clear_caches():
+    """
+    Clear the UI type caches. Choice vocabularies may depend
+    on component registrations.
+    """
+    _object_types.clear()
+    _variant_types.clear()
+    _encoded_schemas.clear()
+
+
+try:
+    from zope.testing.cleanup import addCleanUp
+except ImportError:  # pragma: no cover
+    pass
+else:
+    addCleanUp(clear_caches)
+
+
 class CoreJsonSchemafier(JsonSchemafier):
 
     IGNORE_INTERFACES = (ICreated, ILastModified, ICreatedTime)
 
-    def allow_field(self, name, field):
+    _field_plan = None
+
+    def __init__(self, schema, readonly_override=None, context=None,
+                 field_cache=None):
+        """
+        :param dict field_cache: If given, a dictionary used to share
+            field schemas between schemafiers; see
+            :meth:`DefaultObjectJsonSchemaMaker.make_schemas`.
+        """
+        super(CoreJsonSchemafier, self).__init__(schema,
+                                                 readonly_override=readonly_override,
+                                                 context=context)
+        self.field_cache = field_cache
+
+    @property
+    def field_plan(self):
+        plan = self._field_plan
+        # bound clones share our __dict__, check the schema
+        if plan is None or plan.schema is not self.schema:
+            plan = self._field_plan = get_field_plan(self.schema, type(self))
+        return plan
+
+    def check_field(self, name, field):
+        """
+        Perform the full check of whether the field is allowed.
+        """
         result = not(   name.startswith('_')
                      or field.queryTaggedValue('_ext_excluded_out'))
         if result:
@@ -51,17 +233,42 @@ class CoreJsonSchemafier(JsonSchemafier):
                     break
         return result
 
+    def make_lazy_schema(self):
+        """
+        Like :meth:`make_schema`, but return a :class:`LazyFieldSchemas`
+        that only builds the schemas of the fields that are accessed.
+        """
+        return LazyFieldSchemas(self)
+
+    def allow_field(self, name, field):
+        plan = self.field_plan
+        if plan.fields.get(name) is field:
+            return name in plan.allowed
+        # nested fields and fields from other schemas
+        return self.check_field(name, field)
+
     def process_object(self, field):
         if      IObject.providedBy(field) \
             and field.schema is not interface.Interface:
-            base = field.schema.queryTaggedValue('_ext_mime_type') \
-                or get_ui_type_from_field_interface(field.schema) \
-                or get_ui_type_from_interface(field.schema)
-            return base
+            return get_object_ui_type(field.schema)
         return None
     _process_object = process_object
 
     def process_variant(self, field, ui_type):
+        objects = (type(self), field)
+        result = _variant_types.lookup(objects, ui_type, _marker)
+        if result is _marker:
+            result = _variant_types.store(objects,
+                                          self.resolve_variant(field, ui_type),
+                                          ui_type)
+        return list(result) if isinstance(result, list) else result
+    _process_variant = process_variant
+
+    def resolve_variant(self, field, ui_type):
+        """
+        Compute the base type(s) of a variant field. The result of this is
+        cached by :meth:`process_variant`.
+        """
         base_types = set()
         for field in field.fields:
             base = get_ui_types_from_field(field)[1]
@@ -79,7 +286,21 @@ class CoreJsonSchemafier(JsonSchemafier):
         else:
             ui_base_type = ui_type
         return ui_base_type
-    _process_variant = process_variant
+
+    def _make_field_schema(self, field, name=None):
+        cache = self.field_cache
+        if cache is None:
+            return JsonSchemafier._make_field_schema(self, field, name)
+        # Fields are shared by every interface that inherits them.
+        # The batch holds them alive, so their ids are stable
+        key = (id(field), name)
+        try:
+            item_schema = cache[key]
+        except KeyError:
+            item_schema = JsonSchemafier._make_field_schema(self, field, name)
+            # Keep our own copy, the result may be post processed
+            cache[key] = item_schema
+        return dict(item_schema) if item_schema is not None else None
 
     def get_ui_types_from_field(self, field):
         result = JsonSchemafier.get_ui_types_from_field(self, field)
@@ -112,13 +333,177 @@ class CoreJsonSchemafier(JsonSchemafier):
         return ui_type, ui_base_type
 
 
+def encode_schema(result):
+    """
+    Encode a JSON schema as compact, UTF-8 JSON bytes.
+    """
+    result = json.dumps(result, sort_keys=True, separators=(',', ':'))
+    return result.encode('utf-8')
+
+
+class EncodedSchema(object):
+    """
+    A JSON schema already encoded as UTF-8 JSON bytes, along with
+    a strong entity tag for its content.
+    """
+
+    __slots__ = ('body', 'etag')
+
+    content_type = 'application/json'
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+    def matches(self, if_none_match):
+        """
+        Return if the value of an ``If-None-Match`` header matches
+        this schema, meaning a ``304 Not Modified`` can be sent.
+        """
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            # If-None-Match uses the weak comparison
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == '*' or tag == self.etag:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.body)
+
+
 @interface.implementer(IObjectJsonSchemaMaker)
 class DefaultObjectJsonSchemaMaker(object):
 
     maker = CoreJsonSchemafier
 
-    def make_schema(self, schema, unused_user=None):
+    #: The base schema does not depend on the user, so
+    #: :func:`nti.coremetadata.utils.make_schema` may cache it.
+    #: User specific changes are applied by :meth:`overlay_schema`.
+    cacheable = True
+    user_sensitive = False
+
+    #: An optional :class:`.ISchemaTimingSink`; when set, the
+    #: schemafiers report their timings to it
+    sink = None
+
+    def __init__(self, sink=None):
+        self._snapshot = {}
+        self.sink = sink
+
+    def _schemafier(self, schema, **kwargs):
+        if self.sink is None:
+            return self.maker(schema, **kwargs)
+        factory = timed_schemafier(self.maker)
+        return factory(schema, sink=self.sink, **kwargs)
+
+    def install_snapshot(self, schema, body):
+        """
+        Use the given encoded JSON schema body for the schema instead of
+        building it. See :mod:`nti.coremetadata.snapshot`.
+        """
+        self._snapshot[id(schema)] = (schema, body)
+
+    def _snapshot_body(self, schema):
+        entry = self._snapshot.get(id(schema))
+        return entry[1] if entry is not None else None
+
+    def make_schema(self, schema, user=None):
+        body = self._snapshot_body(schema)
+        if body is not None:
+            result = json.loads(body.decode('utf-8'))
+        else:
+            result = dict()
+            maker = self._schemafier(schema)
+            result[FIELDS] = maker.make_schema()
+        if user is not None:
+            result = self.overlay_schema(result, schema, user)
+        return result
+
+    def make_lazy_schema(self, schema, user=None):
+        """
+        Like :meth:`make_schema`, but the fields are a
+        :class:`LazyFieldSchemas`, so only the fields that are
+        used get built.
+        """
+        if self._snapshot_body(schema) is not None:
+            return self.make_schema(schema, user)
+        result = {FIELDS: self._schemafier(schema).make_lazy_schema()}
+        if user is not None:
+            result = self.overlay_schema(result, schema, user)
+        return result
+
+    def user_overrides(self, schema, user):
+        """
+        Collect the field overrides of all the
+        :class:`.IObjectJsonSchemaUserOverlay` subscribers for the user.
+        """
+        result = {}
+        for overlay in component.subscribers((user,), IObjectJsonSchemaUserOverlay):
+            for name, values in (overlay.overrides(schema) or {}).items():
+                if values is None:
+                    result[name] = None
+                elif name not in result:
+                    result[name] = dict(values)
+                elif result[name] is not None:
+                    result[name].update(values)
+        return result
+
+    def overlay_schema(self, result, schema, user):
+        """
+        Apply the overrides for the user to a schema made by
+        :meth:`make_schema` without a user. Only the overridden fields
+        are touched.
+        """
+        overrides = self.user_overrides(schema, user)
+        fields = result[FIELDS]
+        for name, values in overrides.items():
+            if name not in fields:
+                continue
+            if values is None:
+                del fields[name]
+            else:
+                item_schema = fields[name] = dict(fields[name])
+                item_schema.update(values)
+        return result
+
+    def make_schemas(self, schemas, user=None):
+        """
+        Create the JSON schemas for all the given schemas, like
+        :meth:`make_schema`.
+
+        Field schemas are computed once per field, so fields inherited from
+        a common base interface are only walked once. Each result has its
+        own field dictionaries, but nested values may be shared.
+        """
         result = dict()
-        maker = self.maker(schema)
-        result[FIELDS] = maker.make_schema()
+        field_cache = dict()
+        for schema in schemas:
+            body = self._snapshot_body(schema)
+            if body is not None:
+                item = json.loads(body.decode('utf-8'))
+            else:
+                maker = self._schemafier(schema, field_cache=field_cache)
+                item = {FIELDS: maker.make_schema()}
+            if user is not None:
+                item = self.overlay_schema(item, schema, user)
+            result[schema] = item
+        return result
+
+    def make_encoded_schema(self, schema, user=None):
+        """
+        Return the JSON schema as an :class:`EncodedSchema`. These are
+        cached, so repeated calls do not build or encode anything, unless
+        there are overrides for the user.
+        """
+        if user is not None and self.user_overrides(schema, user):
+            return EncodedSchema(encode_schema(self.make_schema(schema, user)))
+        result = _encoded_schemas.lookup((self, schema))
+        if result is None:
+            body = self._snapshot_body(schema) \
+                or encode_schema(self.make_schema(schema))
+            result = _encoded_schemas.store((self, schema), EncodedSchema(body))
         return result
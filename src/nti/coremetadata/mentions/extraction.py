@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extraction of ``@username`` mentions from text.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import re
+
+import six
+
+from zope.schema.interfaces import ValidationError
+
+from nti.contentfragments.interfaces import IHTMLContentFragment
+
+logger = __import__('logging').getLogger(__name__)
+
+_MENTION = r'(?<![\w@])@([\w.+\-][\w.+\-@]*)'
+
+#: Matches a mention: an ``@`` that does not follow a word character
+#: or another ``@`` (as in an email address), followed by the username,
+#: which may itself be an email address.
+MENTION_PATTERN = re.compile(_MENTION, re.UNICODE)
+
+#: Matches, in a single pass over HTML, either a tag (which is skipped)
+#: or a mention. Tags stop at the next ``<`` so unclosed tags do not
+#: make the scan quadratic.
+HTML_MENTION_PATTERN = re.compile(r'<[^<>]*>|' + _MENTION, re.UNICODE)
+
+# Punctuation ending a sentence is not part of a username
+_TRAILING = u'.+-@'
+
+
+def _mentions_field():
+    from nti.coremetadata.interfaces import IMentionable
+    return IMentionable['mentions'].value_type
+
+
+def _iter_usernames(text):
+    # Only HTML fragments have tags; in other text ``<`` is just a character
+    pattern = HTML_MENTION_PATTERN if IHTMLContentFragment.providedBy(text) \
+                                   else MENTION_PATTERN
+    for match in pattern.finditer(text):
+        username = match.group(1)
+        if username:
+            username = username.rstrip(_TRAILING)
+            if username:
+                yield username
+
+
+def iter_mentioned_usernames(content):
+    """
+    Iterate the usernames mentioned in the text, or in the text parts
+    of a body. The tags of HTML content fragments are skipped. Other
+    body parts are ignored. Usernames are not normalized or
+    deduplicated.
+    """
+    if isinstance(content, six.binary_type):
+        content = content.decode('utf-8')
+    if isinstance(content, six.string_types):
+        content = (content,)
+    for part in content or ():
+        if isinstance(part, six.binary_type):
+            part = part.decode('utf-8')
+        if isinstance(part, six.string_types):
+            for username in _iter_usernames(part):
+                yield username
+
+
+def extract_mentions(content, field=None):
+    """
+    Return the distinct mentions in the content (see
+    :func:`iter_mentioned_usernames`), in order of first appearance,
+    as a tuple of values valid for *field*, by default the value type
+    of :attr:`nti.coremetadata.interfaces.IMentionable.mentions`.
+    The result can be assigned to ``mentions``.
+
+    Each distinct username is converted with the field's
+    ``fromUnicode`` (which lowercases it) once; usernames the field
+    rejects are dropped.
+    """
+    field = _mentions_field() if field is None else field
+    seen = set()
+    result = []
+    for username in iter_mentioned_usernames(content):
+        key = username.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            mention = field.fromUnicode(username)
+        except ValidationError:
+            logger.debug("Ignoring invalid mention %r", username)
+            continue
+        # Conversion may normalize differently spelled usernames alike
+        if mention != key:
+            if mention in seen:
+                continue
+            seen.add(mention)
+        result.append(mention)
+    return tuple(result)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A reverse index of mentions: which objects mention a username.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import six
+
+import BTrees
+
+from BTrees.Length import Length
+
+from persistent import Persistent
+
+from zope import component
+from zope import interface
+
+from zope.container.contained import Contained
+
+from zope.intid.interfaces import IIntIds
+from zope.intid.interfaces import IIntIdAddedEvent
+from zope.intid.interfaces import IIntIdRemovedEvent
+
+from nti.coremetadata.interfaces import IMentionable
+
+from nti.coremetadata.mentions.interfaces import IMentionIndex
+from nti.coremetadata.mentions.interfaces import IMentionsModifiedEvent
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _username(user):
+    return getattr(user, 'username', user).lower()
+
+
+@interface.implementer(IMentionIndex)
+class MentionIndex(Persistent, Contained):
+    """
+    Maps each lowercased username to the set of intids of the
+    objects mentioning it, and each intid to its usernames so
+    that documents are reindexed by their difference.
+    """
+
+    family = BTrees.family64
+
+    def __init__(self, family=None):
+        if family is not None:
+            self.family = family
+        self.clear()
+
+    def clear(self):
+        # username -> IF.TreeSet of docids
+        self._fwd_index = self.family.OO.BTree()
+        # docid -> tuple of usernames
+        self._rev_index = self.family.IO.BTree()
+        self._num_docs = Length(0)
+
+    def documentCount(self):
+        return self._num_docs()
+
+    def wordCount(self):
+        return len(self._fwd_index)
+
+    def _add(self, docid, usernames):
+        for username in usernames:
+            docids = self._fwd_index.get(username)
+            if docids is None:
+                docids = self._fwd_index[username] = self.family.IF.TreeSet()
+            docids.insert(docid)
+
+    def _remove(self, docid, usernames):
+        for username in usernames:
+            docids = self._fwd_index.get(username)
+            if docids is not None:
+                docids.remove(docid)
+                if not docids:
+                    del self._fwd_index[username]
+
+    def _reindex(self, docid, old, new):
+        if old is None:
+            if not new:
+                return
+            self._num_docs.change(1)
+            old = frozenset()
+        elif old == new:
+            return
+        self._remove(docid, old - new)
+        self._add(docid, new - old)
+        if new:
+            self._rev_index[docid] = tuple(sorted(new))
+        else:
+            del self._rev_index[docid]
+            self._num_docs.change(-1)
+
+    def _indexed(self, docid):
+        old = self._rev_index.get(docid)
+        return frozenset(old) if old is not None else None
+
+    def index_doc(self, docid, value):
+        if IMentionable.providedBy(value):
+            value = value.mentions
+        new = frozenset(_username(x) for x in value or ())
+        self._reindex(docid, self._indexed(docid), new)
+
+    def reindex_doc(self, docid, added=(), removed=()):
+        old = self._indexed(docid)
+        new = (old or frozenset()).difference(_username(x) for x in removed)
+        self._reindex(docid, old, new.union(_username(x) for x in added))
+
+    def unindex_doc(self, docid):
+        old = self._rev_index.pop(docid, None)
+        if old is not None:
+            self._num_docs.change(-1)
+            self._remove(docid, old)
+
+    def mentionsOf(self, docid):
+        return self._rev_index.get(docid, ())
+
+    def mentioning(self, user):
+        return self.apply(_username(user))
+
+    def apply(self, query):
+        IF = self.family.IF
+        if isinstance(query, six.string_types):
+            docids = self._fwd_index.get(query.lower())
+            return IF.Set(docids) if docids is not None else IF.Set()
+        sets = (self._fwd_index.get(_username(x)) for x in query)
+        return IF.multiunion([x for x in sets if x is not None])
+
+
+def _index_and_docid(obj):
+    index = component.queryUtility(IMentionIndex)
+    intids = component.queryUtility(IIntIds)
+    if index is None or intids is None:
+        return None, None
+    return index, intids.queryId(obj)
+
+
+def reindex_mentions(obj):
+    """
+    Update the registered :class:`IMentionIndex` with the mentions of
+    the object, if it has an intid.
+    """
+    index, docid = _index_and_docid(obj)
+    if docid is not None:
+        index.index_doc(docid, obj)
+
+
+@component.adapter(IMentionable, IMentionsModifiedEvent)
+def _mentions_modified(obj, event):
+    index, docid = _index_and_docid(obj)
+    if docid is None:
+        return
+    if index.mentionsOf(docid):
+        index.reindex_doc(docid, event.added, event.removed)
+    else:
+        # Not indexed yet (or had no mentions): the difference may miss
+        # mentions the object already had
+        index.index_doc(docid, obj)
+
+
+# IntId events are not object events, so these are not dispatched by
+# the type of their object
+
+
+@component.adapter(IIntIdAddedEvent)
+def _intid_added(event):
+    if IMentionable.providedBy(event.object):
+        reindex_mentions(event.object)
+
+
+@component.adapter(IIntIdRemovedEvent)
+def _intid_removed(event):
+    if IMentionable.providedBy(event.object):
+        index, docid = _index_and_docid(event.object)
+        if docid is not None:
+            index.unindex_doc(docid)
@@ -8,6 +8,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+from zope import interface
+
+from zope.index.interfaces import IInjection
+from zope.index.interfaces import IStatistics
+from zope.index.interfaces import IIndexSearch
+
+from zope.interface.interfaces import ObjectEvent
+from zope.interface.interfaces import IObjectEvent
+
 from nti.contentfragments.interfaces import IPlainTextLineField
 
 
@@ -17,3 +26,52 @@ class IMentionField(IPlainTextLineField):
 
     .. versionadded:: 1.2.0
     """
+
+
+class IMentionIndex(IInjection, IIndexSearch, IStatistics):
+    """
+    An index of the objects, by intid, that mention each username.
+
+    Documents are indexed from their ``mentions`` (or from an iterable
+    of usernames). Queries are a username, or an iterable of usernames
+    matching documents that mention any of them, and return a
+    ``family64`` integer set that can be intersected with the results
+    of other catalog indexes.
+    """
+
+    def mentioning(user):
+        """
+        Return the intids of the objects that mention the user (or
+        username).
+        """
+
+    def mentionsOf(docid):
+        """
+        Return the usernames indexed for the document, or an empty tuple.
+        """
+
+    def reindex_doc(docid, added=(), removed=()):
+        """
+        Add and remove usernames (or users) from those indexed for the
+        document, touching only the entries of the changed usernames.
+        Use :meth:`index_doc` for documents not indexed yet.
+        """
+
+
+class IMentionsModifiedEvent(IObjectEvent):
+    """
+    Fired when assigning the mentions of an object changes them. Only
+    the difference is carried; at least one of the sets is not empty.
+    """
+
+    added = interface.Attribute(u"The frozenset of newly mentioned usernames")
+    removed = interface.Attribute(u"The frozenset of usernames no longer mentioned")
+
+
+@interface.implementer(IMentionsModifiedEvent)
+class MentionsModifiedEvent(ObjectEvent):
+
+    def __init__(self, obj, added=frozenset(), removed=frozenset()):
+        super(MentionsModifiedEvent, self).__init__(obj)
+        self.added = added
+        self.removed = removed
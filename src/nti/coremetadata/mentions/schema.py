@@ -8,12 +8,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import re
+
 from zope import interface
 
 from nti.contentfragments.schema import PlainTextLine
 
 from nti.coremetadata.mentions.interfaces import IMentionField
 
+# Matches the same characters as str.split() and str.strip()
+_WHITESPACE = re.compile(r'\s', re.UNICODE)
+
 logger = __import__('logging').getLogger(__name__)
 
 
@@ -27,5 +32,8 @@ class Mention(PlainTextLine):
         return super(Mention, self).fromUnicode(value.lower())
 
     def constraint(self, value):
-        return (super(Mention, self).constraint(value)
-                and len(value.split()) == 1)
+        # A single word: len(value.split()) == 1
+        if not super(Mention, self).constraint(value):
+            return False
+        value = value.strip()
+        return bool(value) and _WHITESPACE.search(value) is None
@@ -19,15 +19,19 @@ from zope import deferredimport
 
 from zope.container.contained import Contained
 
+from zope.event import notify
+
 from zope.schema.fieldproperty import FieldPropertyStoredThroughField
 
 from nti.coremetadata.interfaces import IContained
 from nti.coremetadata.interfaces import IVersioned
 from nti.coremetadata.interfaces import IMentionable
 
-from nti.property.property import alias
+from nti.coremetadata.mentions.interfaces import MentionsModifiedEvent
 
-from nti.schema.fieldproperty import UnicodeConvertingFieldProperty
+from nti.coremetadata.schema import UnicodeConvertingFieldProperty
+
+from nti.property.property import alias
 
 logger = __import__('logging').getLogger(__name__)
 
@@ -114,14 +118,66 @@ class VersionedMixin(object):
         return self.version
 
 
+class _MentionsFieldProperty(FieldPropertyStoredThroughField):
+    """
+    Stores mentions and notifies an :class:`IMentionsModifiedEvent`
+    with the difference if they changed.
+    """
+
+    def setValue(self, inst, field, value):
+        old = inst._mentions_set()
+        super(_MentionsFieldProperty, self).setValue(inst, field, value)
+        new = inst._mentions_set()
+        added = new - old
+        removed = old - new
+        if added or removed:
+            notify(MentionsModifiedEvent(inst, added, removed))
+
+
 @interface.implementer(IMentionable)
 class MentionableMixin(object):
 
-    mentions = FieldPropertyStoredThroughField(IMentionable['mentions'])
+    mentions = _MentionsFieldProperty(IMentionable['mentions'])
+
+    # The mentions tuple and a frozenset of it. Only the tuple is
+    # persisted or pickled; the set is rebuilt when the tuple is replaced.
+    _v_mentions_set = (None, frozenset())
+
+    def _mentions_set(self):
+        mentions = self.mentions
+        stored, result = self._v_mentions_set
+        if stored is not mentions:
+            result = frozenset(mentions or ())
+            self._v_mentions_set = (mentions, result)
+        return result
+
+    def __getstate__(self):
+        # Persistent objects do not save volatile attributes, but
+        # other objects would pickle the set along with the tuple
+        getstate = getattr(super(MentionableMixin, self), '__getstate__', None)
+        state = getstate() if getstate is not None else self.__dict__
+        if isinstance(state, dict) and '_v_mentions_set' in state:
+            state = dict(state)
+            del state['_v_mentions_set']
+        return state
 
     def isMentionedDirectly(self, user):
         if not self.mentions:
             return False
 
-        username = getattr(user, "username", user)
-        return username in self.mentions
+        if not isinstance(user, six.string_types):
+            user = getattr(user, "username", user)
+        return user in self._mentions_set()
+
+    def filterMentionedDirectly(self, users):
+        mentions = self._mentions_set()
+        if not mentions:
+            return []
+
+        users = list(users)
+        usernames = [x if isinstance(x, six.string_types)
+                     else getattr(x, "username", x)
+                     for x in users]
+        mentioned = mentions.intersection(usernames)
+        return [user for user, username in zip(users, usernames)
+                if username in mentioned]
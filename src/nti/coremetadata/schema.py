@@ -8,10 +8,32 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import sys
+import copy
+import hashlib
+import threading
+
+from contextlib import contextmanager
+
+try:
+    from collections.abc import Iterator
+except ImportError:  # pragma: no cover
+    from collections import Iterator
+
 import six
 
+from zope import component
+
+from zope.event import notify
+
+from zope.schema.fieldproperty import NO_VALUE
 from zope.schema.fieldproperty import FieldProperty
+from zope.schema.fieldproperty import FieldUpdatedEvent
+
+from zope.schema import URI
 
+from zope.schema.interfaces import TooLong
+from zope.schema.interfaces import InvalidURI
 from zope.schema.interfaces import ValidationError
 
 from nti.base.interfaces import INamed
@@ -19,10 +41,17 @@ from nti.base.interfaces import INamed
 from nti.contentfragments.schema import PlainText
 from nti.contentfragments.schema import SanitizedHTMLContentFragment
 
+from nti.coremetadata.cache import IdentityCache
+
+from nti.coremetadata.dataurl import LazyDataURL
+from nti.coremetadata.dataurl import is_data_header
+
 from nti.coremetadata.interfaces import IMedia
 from nti.coremetadata.interfaces import ICanvas
 from nti.coremetadata.interfaces import IEmbeddedLink
 
+from nti.coremetadata.validation import compile_validator
+
 from nti.property.schema import DataURI as ProDataURI
 
 from nti.schema.field import Object
@@ -30,6 +59,15 @@ from nti.schema.field import Variant
 from nti.schema.field import ListOrTupleFromObject
 from nti.schema.field import ValidURI as _ValidURI
 
+#: Maximum number of converted body parts kept by :func:`convert_body_part`
+BODY_PART_CACHE_SIZE = 4096
+
+#: Maximum total size, in bytes, of the cached body parts
+BODY_PART_CACHE_WEIGHT = 16 * 1024 * 1024
+
+#: Maximum number of body part variants shared by :func:`bodySchemaField`
+BODY_VARIANT_CACHE_SIZE = 256
+
 logger = __import__('logging').getLogger(__name__)
 
 
@@ -40,11 +78,189 @@ class DataURI(_ValidURI, ProDataURI):  # order matters
         super(DataURI, self)._validate(value)
 
 
-class AbstractFieldProperty(FieldProperty):
+class LazyDataURI(DataURI):
+    """
+    A :class:`DataURI` whose values are :class:`.LazyDataURL` objects.
+    Only the header of the URI is validated; the payload is decoded
+    when it is first used.
+    """
+
+    def _validate(self, value):
+        # Skip the URI checks, which scan the whole payload
+        super(URI, self)._validate(value)  # pylint: disable=bad-super-call
+        if not is_data_header(value):
+            raise InvalidURI(value).with_field_and_value(self, value)
+
+    def fromUnicode(self, value):
+        if isinstance(value, LazyDataURL):
+            return value
+        value = LazyDataURL(value.strip())
+        self.validate(value)
+        return value
+
+
+_trusted = threading.local()
+
+
+@contextmanager
+def trusted_assignment():
+    """
+    A context manager in which values assigned through an
+    :class:`AbstractFieldProperty` in this thread are stored without
+    validation or adaptation. Only use it for values known to be valid,
+    e.g. when copying them from another object during migrations.
+    """
+    depth = getattr(_trusted, 'depth', 0)
+    _trusted.depth = depth + 1
+    try:
+        yield
+    finally:
+        _trusted.depth = depth
+
+
+def in_trusted_assignment():
+    return getattr(_trusted, 'depth', 0) > 0
+
+
+def _has_raw_text(value):
+    # Plain (not fragment) strings never validate as body parts
+    if isinstance(value, (list, tuple)):
+        for x in value:
+            if type(x) in (six.text_type, six.binary_type):
+                return True
+    return False
+
+
+_marker = object()
+
+_IMMUTABLE_TYPES = (six.text_type, six.binary_type, float, type(None)) \
+                 + six.integer_types
+
+
+def _is_immutable(value):
+    # Values that cannot have become invalid since they were validated
+    if type(value) is tuple:
+        return all(_is_immutable(x) for x in value)
+    return isinstance(value, _IMMUTABLE_TYPES)
+
+
+_part_cache = IdentityCache(BODY_PART_CACHE_SIZE, BODY_PART_CACHE_WEIGHT)
+
+
+def convert_body_part(value_type, part):
+    """
+    Convert the body part with the ``fromObject`` of the given value
+    type. The conversions of plain strings, which sanitize them, are
+    cached by content hash for each site manager, since the sanitizing
+    policy may be customized by site.
+    """
+    if type(part) not in (six.text_type, six.binary_type):
+        return value_type.fromObject(part)
+    if isinstance(part, six.binary_type):
+        part = part.decode('utf-8')
+    objects = (value_type, component.getSiteManager())
+    digest = hashlib.sha1(part.encode('utf-8')).digest()
+    result = _part_cache.lookup(objects, digest)
+    if result is None:
+        result = value_type.fromObject(part)
+        _part_cache.store(objects, result, digest, weight=sys.getsizeof(result))
+    return result
+
+
+def valid_body_part(value_type, part):
+    """
+    Return the body part, converted if needed, once it is valid
+    for the given value type. Parts for value types that cannot
+    convert objects are only validated.
+    """
+    if getattr(value_type, 'fromObject', None) is None:
+        value_type.validate(part)
+        return part
+    if type(part) in (six.text_type, six.binary_type):
+        return convert_body_part(value_type, part)
+    try:
+        value_type.validate(part)
+        return part
+    except ValidationError:
+        return value_type.fromObject(part)
+
+
+def body_part_cache_stats():
+    """
+    Return the usage statistics of the body part cache.
+    """
+    return _part_cache.stats()
+
+
+def clear_body_part_cache():
+    _part_cache.clear()
+    _part_cache.reset_stats()
+
+
+def _registration_changed(unused_event=None):
+    """
+    The adapters sanitizing body parts may be different now.
+    """
+    _part_cache.clear()
+
+
+try:
+    from zope.testing.cleanup import addCleanUp
+except ImportError:  # pragma: no cover
+    pass
+else:
+    addCleanUp(clear_body_part_cache)
+
+
+class ValidatedFieldProperty(FieldProperty):
+    """
+    A :class:`zope.schema.fieldproperty.FieldProperty` that validates
+    values with a validator compiled from its field.
+
+    .. seealso:: :func:`nti.coremetadata.validation.compile_validator`
+    """
+
+    _validator = None
 
     def __init__(self, field, name=None):
-        super(AbstractFieldProperty, self).__init__(field, name=name)
+        super(ValidatedFieldProperty, self).__init__(field, name=name)
         self._field = field
+        self._name = name or field.__name__
+
+    def _validate(self, inst, value):
+        if self._validator is None:
+            self._validator = compile_validator(self._field)
+        self._validator(value, inst)
+
+    def _store(self, inst, value):
+        """
+        Store the value without validating it.
+        """
+        field = self._field.bind(inst)
+        if field.readonly and self._name in inst.__dict__:
+            raise ValueError(self._name, 'field is readonly')
+        oldvalue = self.queryValue(inst, NO_VALUE)
+        inst.__dict__[self._name] = value
+        notify(FieldUpdatedEvent(inst, field, oldvalue, value))
+
+    def __set__(self, inst, value):
+        self._validate(inst, value)
+        self._store(inst, value)
+
+
+class UnicodeConvertingFieldProperty(ValidatedFieldProperty):
+    """
+    A :class:`ValidatedFieldProperty` that accepts UTF-8 encoded bytes,
+    like :class:`nti.schema.fieldproperty.UnicodeConvertingFieldProperty`.
+    """
+
+    def __set__(self, inst, value):
+        if isinstance(value, six.binary_type):
+            value = value.decode('utf-8')
+        super(UnicodeConvertingFieldProperty, self).__set__(inst, value)
+
+
+class AbstractFieldProperty(ValidatedFieldProperty):
 
     def _to_tuple(self, value):
         if value and isinstance(value, (set, list)):
@@ -54,30 +270,166 @@ class AbstractFieldProperty(FieldProperty):
     def _adapt(self, value):
         return self._field.fromObject(value)
 
+    def _needs_adapt(self, unused_value):
+        """
+        Return whether the value is known to fail validation but can be
+        adapted, so the adaptation can be done before validating.
+        """
+        return False
+
+    def _validate_adapted(self, inst, value):
+        """
+        Validate a value returned by :meth:`_adapt`.
+        """
+        self._validate(inst, value)
+
+    def _is_adapted(self, value):
+        """
+        Return whether the type of the value (or, for sequences, the
+        type of each of its parts) already provides the schema of the
+        field, so adapting cannot make an invalid value valid.
+        """
+        field = self._field
+        schema = getattr(field, 'schema', None)
+        if schema is not None:
+            return schema.implementedBy(type(value))
+        schema = getattr(getattr(field, 'value_type', None), 'schema', None)
+        if schema is not None and value and isinstance(value, tuple):
+            return all(schema.implementedBy(type(x)) for x in value)
+        return False
+
+    _seq_validator = None
+
+    def _validate_sequence(self, inst, value):
+        # Check the sequence itself, once its parts are known to be
+        # valid, with the body field without its value type
+        if self._seq_validator is None:
+            field = copy.copy(self._field)
+            field.value_type = None
+            self._seq_validator = compile_validator(field)
+        self._seq_validator(value, inst)
+
+    def _iter_valid_parts(self, parts):
+        field = self._field
+        for count, part in enumerate(parts, 1):
+            if field.max_length is not None and count > field.max_length:
+                raise TooLong(parts, field.max_length).with_field_and_value(field, parts)
+            yield valid_body_part(field.value_type, part)
+
+    def _set_stream(self, inst, parts):
+        """
+        Validate and convert the parts produced by the iterator one at
+        a time, stopping at the first invalid one, and store them as
+        a tuple.
+        """
+        if getattr(self._field, 'value_type', None) is None:
+            self.__set__(inst, tuple(parts))
+            return
+        value = tuple(self._iter_valid_parts(parts))
+        self._validate_sequence(inst, value)
+        self._store(inst, value)
+
     def __set__(self, inst, value):
         value = self._to_tuple(value)
-        try:
-            super(AbstractFieldProperty, self).__set__(inst, value)
-        except ValidationError:
-            # Hmm. try to adapt
-            value = self._adapt(value)
-            super(AbstractFieldProperty, self).__set__(inst, value)
+        if isinstance(value, Iterator):
+            if not in_trusted_assignment():
+                self._set_stream(inst, value)
+                return
+            value = tuple(value)
+        if     in_trusted_assignment() \
+            or (    inst.__dict__.get(self._name, _marker) is value
+                and _is_immutable(value)):
+            # Trusted, or the immutable value we already validated
+            self._store(inst, value)
+        else:
+            if self._needs_adapt(value):
+                value = self._adapt(value)
+                self._validate_adapted(inst, value)
+            elif self._is_adapted(value):
+                self._validate(inst, value)
+            else:
+                try:
+                    self._validate(inst, value)
+                except ValidationError:
+                    # Hmm. try to adapt
+                    value = self._adapt(value)
+                    self._validate_adapted(inst, value)
+            self._store(inst, value)
 
 
 class BodyFieldProperty(AbstractFieldProperty):
 
+    def _needs_adapt(self, value):
+        return _has_raw_text(value)
+
     def _adapt(self, value):
         # Allow ascii strings for old app tests
-        value = [
-            x.decode('utf-8') if isinstance(x, six.binary_type) else x for x in value
-        ]
-        value = tuple(self._field.value_type.fromObject(x) for x in value)
-        return value
+        value_type = self._field.value_type
+        return tuple(convert_body_part(value_type, x) for x in value)
+
+    def _validate_adapted(self, inst, value):
+        # Converting validated each part
+        self._validate_sequence(inst, value)
+
+    def adapt_many(self, values):
+        """
+        Return a list with the given body sequences converted to tuples
+        of valid body parts. Each distinct string is decoded and sanitized
+        once and each distinct other part validated once, no matter how
+        many of the sequences it appears in.
+        """
+        value_type = self._field.value_type
+        parts = {}
+        seen = []  # keep the parts keyed by id alive
+        result = []
+        for value in values:
+            value = self._to_tuple(value)
+            if value is None or not isinstance(value, (list, tuple)):
+                result.append(value)
+                continue
+            adapted = []
+            for x in value:
+                raw = type(x) in (six.text_type, six.binary_type)
+                key = x if raw else id(x)
+                part = parts.get(key, _marker)
+                if part is _marker:
+                    if not raw:
+                        seen.append(x)
+                    part = parts[key] = valid_body_part(value_type, x)
+                adapted.append(part)
+            result.append(tuple(adapted))
+        return result
+
+    def set_many(self, items):
+        """
+        Assign many bodies at once, given an iterable of ``(inst, value)``
+        pairs. The values are converted with :meth:`adapt_many`; all are
+        converted and validated before any is assigned.
+        """
+        items = list(items)
+        values = self.adapt_many(value for _, value in items)
+        for (inst, _), value in zip(items, values):
+            self._validate_sequence(inst, value)
+        for (inst, _), value in zip(items, values):
+            self._store(inst, value)
 NoteBodyFieldProperty = BodyFieldProperty # BWC
 
 
 class MessageInfoBodyFieldProperty(AbstractFieldProperty):
 
+    def _needs_adapt(self, value):
+        return _has_raw_text(value)
+
+    def _adapt(self, value):
+        if not isinstance(value, (list, tuple)):
+            return super(MessageInfoBodyFieldProperty, self)._adapt(value)
+        value_type = self._field.value_type
+        return tuple(convert_body_part(value_type, x) for x in value)
+
+    def _validate_adapted(self, inst, value):
+        # Converting validated each part
+        self._validate_sequence(inst, value)
+
     def _to_tuple(self, value):
         # Turn bytes into text
         if isinstance(value, six.binary_type):
@@ -91,17 +443,100 @@ class MessageInfoBodyFieldProperty(AbstractFieldProperty):
         return value
 
 
+class DispatchingVariant(Variant):
+    """
+    A :class:`nti.schema.field.Variant` that validates a value only
+    against the first of its fields that can accept the value's type
+    or provided interfaces, instead of trying each field in order.
+
+    Values for which that cannot be decided, or that the chosen field
+    rejects, are validated by trying every field in order, so the
+    result and errors are those of a plain variant.
+    """
+
+    _dispatch_plan = None
+
+    def _plan(self):
+        # Bound clones share the plan of their field, which only
+        # depends on the kinds of the fields
+        if self._dispatch_plan is None:
+            self._dispatch_plan = tuple(
+                (getattr(f, 'schema', None), f._type, f.missing_value)
+                for f in self.fields
+            )
+        return self._dispatch_plan
+
+    def _dispatch(self, value):
+        for index, (iface, kind, missing) in enumerate(self._plan()):
+            if iface is None and kind is None:
+                return None  # anything may be valid
+            if     (iface is None or iface.providedBy(value)) \
+               and (kind is None or isinstance(value, kind)):
+                return self.fields[index]
+            if value == missing:
+                return None  # a missing value may be valid
+        return None
+
+    def _validate(self, value):
+        field = self._dispatch(value)
+        if field is not None:
+            super(Variant, self)._validate(value)  # pylint: disable=bad-super-call
+            try:
+                field.validate(value)
+                return
+            except ValidationError:
+                pass
+        super(DispatchingVariant, self)._validate(value)
+
+
+def _default_body_types():
+    return (
+        SanitizedHTMLContentFragment(min_length=1,
+                                     description=u"HTML content that is sanitized and non-empty"),
+        Object(ICanvas, description=u"A :class:`.ICanvas`"),
+        Object(IMedia, description=u"A :class:`.IMedia`"),
+        PlainText(min_length=1,
+                  description=u"Plain text that is sanitized and non-empty")
+    )
+
+
+def _extended_body_types():
+    return (
+        Object(INamed, description=u"A :class:`.INamed`"),
+        Object(IEmbeddedLink, description=u"A :class:`.IEmbeddedLink`"),
+    )
+
+
 def legacyModeledContentBodyTypes():
-    return [SanitizedHTMLContentFragment(min_length=1,
-                                         description=u"HTML content that is sanitized and non-empty"),
-            Object(ICanvas, description=u"A :class:`.ICanvas`"),
-            Object(IMedia, description=u"A :class:`.IMedia`"),
-            PlainText(min_length=1,
-                      description=u"Plain text that is sanitized and non-empty")]
+    """
+    Return a new list of new fields of the default body parts.
+    """
+    return list(_default_body_types())
+
+
+# Variants by the given part fields (None for the defaults),
+# extension and dispatch mode. The default variants are built from
+# fields of their own, which nothing else can rebind.
+_body_variants = IdentityCache(BODY_VARIANT_CACHE_SIZE)
+
+
+def _body_variant(fields, dispatch, extended=False):
+    objects = tuple(fields) if fields is not None else ()
+    extra = (fields is None, extended, dispatch)
+    result = _body_variants.lookup(objects, extra)
+    if result is None:
+        parts = objects if fields is not None else _default_body_types()
+        if extended:
+            parts += _extended_body_types()
+        factory = DispatchingVariant if dispatch else Variant
+        result = factory(fields=parts, title=u"A body part", __name__='body')
+        _body_variants.store(objects, result, extra)
+    return result
 
 
-def bodySchemaField(fields, required=False):
-    value_type = Variant(fields=fields, title=u"A body part", __name__='body')
+def _body_field(value_type, required):
+    # Each interface attribute needs its own field, interfaces
+    # set the ``interface`` of their attributes.
     return ListOrTupleFromObject(title=u"The body of this object",
                                  description=u"""
                                  An ordered sequence of body parts
@@ -114,17 +549,25 @@ def bodySchemaField(fields, required=False):
                                  __name__='body')
 
 
-def CompoundModeledContentBody(required=False, fields=()):
+def bodySchemaField(fields, required=False, dispatch=False):
+    """
+    Bodies made of the same field instances share the field
+    validating their parts.
+
+    :keyword bool dispatch: If true, the body parts are validated with a
+        :class:`DispatchingVariant`.
+    """
+    return _body_field(_body_variant(fields, dispatch), required)
+
+
+def CompoundModeledContentBody(required=False, fields=(), dispatch=False):
     """
     Returns a :class:`zope.schema.interfaces.IField` representing
     the way that a compound body of user-generated content is modeled.
     """
-    fields = legacyModeledContentBodyTypes() if not fields else fields
-    return bodySchemaField(fields, required)
+    return _body_field(_body_variant(fields or None, dispatch), required)
 
 
-def ExtendedCompoundModeledContentBody(required=False, fields=()):
-    fields = legacyModeledContentBodyTypes() if not fields else fields
-    fields.append(Object(INamed, description=u"A :class:`.INamed`"))
-    fields.append(Object(IEmbeddedLink, description=u"A :class:`.IEmbeddedLink`"),)
-    return bodySchemaField(fields, required)
+def ExtendedCompoundModeledContentBody(required=False, fields=(), dispatch=False):
+    value_type = _body_variant(fields or None, dispatch, extended=True)
+    return _body_field(value_type, required)
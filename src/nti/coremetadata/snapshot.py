@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline snapshots of JSON schemas.
+
+A snapshot holds the encoded JSON schemas of a set of interfaces
+(by default, every interface registered as an
+:class:`zope.interface.interfaces.IInterface` utility) as produced by
+the registered :class:`nti.coremetadata.interfaces.IObjectJsonSchemaMaker`.
+Loading a snapshot at startup installs those schemas into the maker,
+so worker processes do not have to build them on their first requests.
+
+Each schema is stored with a fingerprint of its interface definition
+(including the interfaces its fields refer to) and of the versions of
+the packages generating it; schemas whose fingerprint changed are not
+installed and should be rebuilt, which :func:`ensure_snapshot` does.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import json
+import zlib
+import types
+import hashlib
+
+from numbers import Number
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
+
+import six
+
+from zope import component
+
+from zope.interface.declarations import Declaration
+
+from zope.interface.interface import Element
+
+from zope.interface.interfaces import IInterface
+
+from zope.schema.interfaces import IIterableVocabulary
+
+from nti.coremetadata.cache import IdentityCache
+
+from nti.coremetadata.interfaces import IObjectJsonSchemaMaker
+
+from nti.coremetadata.jsonschema import encode_schema
+
+#: The version of the snapshot format
+SNAPSHOT_VERSION = 1
+
+#: Maximum number of fingerprints kept by :func:`schema_fingerprint`
+FINGERPRINT_CACHE_SIZE = 1024
+
+logger = __import__('logging').getLogger(__name__)
+
+
+#: The distributions whose code determines the generated schemas
+_SCHEMA_DISTRIBUTIONS = ('nti.schema', 'nti.coremetadata')
+
+_versions = []
+
+_fingerprints = IdentityCache(FINGERPRINT_CACHE_SIZE)
+
+
+def _distribution_versions():
+    if not _versions:
+        import pkg_resources  # slow to import, and only needed here
+        for name in _SCHEMA_DISTRIBUTIONS:
+            try:
+                version = pkg_resources.get_distribution(name).version
+            except pkg_resources.DistributionNotFound:  # pragma: no cover
+                version = ''
+            _versions.append('%s==%s' % (name, version))
+    return _versions
+
+
+def _stable_repr(value, seen):
+    # Only values whose repr does not change between processes
+    if isinstance(value, (six.string_types, six.binary_type, Number, type(None))):
+        return repr(value)
+    if IInterface.providedBy(value):
+        # Nested schemas (of Object fields, for example) contribute
+        # their whole definition, once
+        if value in seen:
+            return value.__identifier__
+        return '{%s}' % ';'.join(_describe_interface(value, seen))
+    if isinstance(value, (tuple, list)):
+        return '(%s)' % ','.join(_stable_repr(x, seen) for x in value)
+    if isinstance(value, (frozenset, set)):
+        return '{%s}' % ','.join(sorted(_stable_repr(x, seen) for x in value))
+    if isinstance(value, Mapping):
+        items = ('%s:%s' % (_stable_repr(k, seen), _stable_repr(v, seen))
+                 for k, v in value.items())
+        return '{%s}' % ','.join(sorted(items))
+    if IIterableVocabulary.providedBy(value):
+        terms = ('%s/%s/%s' % (_stable_repr(term.value, seen),
+                               _stable_repr(getattr(term, 'token', None), seen),
+                               _stable_repr(getattr(term, 'title', None), seen))
+                 for term in value)
+        return '[%s]' % ','.join(terms)
+    if isinstance(value, Declaration):
+        return '<%s>' % ','.join(x.__identifier__ for x in value.flattened())
+    if isinstance(value, Element):
+        return '<%s>' % _describe(value, seen)
+    if isinstance(value, (type, types.FunctionType, types.MethodType)):
+        name = getattr(value, '__qualname__', None) or value.__name__
+        return '%s.%s' % (value.__module__, name)
+    raise TypeError("Cannot fingerprint %r" % (value,))
+
+
+def _describe_tags(element, seen):
+    return ['%s:%s' % (tag, _stable_repr(element.getTaggedValue(tag), seen))
+            for tag in sorted(element.getTaggedValueTags())]
+
+
+def _describe(element, seen,
+              # creation order varies between processes, the rest
+              # point back to elements we are already describing
+              _excluded=('order', 'interface', '__parent__')):
+    cls = type(element)
+    parts = ['%s.%s' % (cls.__module__, cls.__name__)]
+    for name, value in sorted(element.__dict__.items()):
+        if name not in _excluded and not name.startswith('_v_'):
+            parts.append('%s=%s' % (name, _stable_repr(value, seen)))
+    parts.extend(_describe_tags(element, seen))
+    return ';'.join(parts)
+
+
+def _describe_interface(schema, seen):
+    seen.add(schema)
+    parts = []
+    for iface in schema.__iro__:
+        parts.append(iface.__identifier__)
+        parts.extend(_describe_tags(iface, seen))
+    for name in sorted(schema.names(all=True)):
+        parts.append('%s->%s' % (name, _describe(schema[name], seen)))
+    return parts
+
+
+def schema_fingerprint(schema, maker=None):
+    """
+    Return a hash of the definition of the given schema, everything
+    it inherits and the schemas its fields refer to, as made by the
+    given maker with the installed versions of the packages generating
+    the schemas.
+
+    Fingerprints are cached for each interface object, so they do not
+    reflect changes made to an interface after it was fingerprinted.
+
+    :raises TypeError: If the definition has values (such as field
+        defaults or tagged values) that cannot be fingerprinted.
+    """
+    cls = type(maker) if maker is not None else None
+    result = _fingerprints.lookup((schema,), cls)
+    if result is not None:
+        return result
+    result = hashlib.sha1()
+    parts = list(_distribution_versions())
+    if cls is not None:
+        parts.append('%s.%s' % (cls.__module__, cls.__name__))
+    parts.extend(_describe_interface(schema, set()))
+    for part in parts:
+        result.update(part.encode('utf-8'))
+    result = result.hexdigest()
+    _fingerprints.store((schema,), result, cls)
+    return result
+
+
+def clear_fingerprint_cache():
+    _fingerprints.clear()
+
+
+try:
+    from zope.testing.cleanup import addCleanUp
+except ImportError:  # pragma: no cover
+    pass
+else:
+    addCleanUp(clear_fingerprint_cache)
+
+
+def _content_hash(entries):
+    result = hashlib.sha1()
+    for name in sorted(entries):
+        entry = entries[name]
+        for part in (name, entry['fingerprint'], entry['body']):
+            result.update(part.encode('utf-8'))
+    return result.hexdigest()
+
+
+def registered_schemas():
+    """
+    Return the interfaces registered as :class:`IInterface` utilities.
+    """
+    result = {iface for _, iface in component.getUtilitiesFor(IInterface)}
+    return sorted(result, key=lambda x: x.__identifier__)
+
+
+def _encoded_body(maker, schema):
+    if hasattr(maker, 'make_encoded_schema'):
+        return maker.make_encoded_schema(schema).body
+    return encode_schema(maker.make_schema(schema))
+
+
+def dump_snapshot(path, schemas=None, maker=None):
+    """
+    Write the JSON schemas of the given interfaces (by default, all
+    registered interfaces) to a compressed snapshot file.
+
+    :return: The number of schemas written.
+    """
+    maker = component.getUtility(IObjectJsonSchemaMaker) if maker is None else maker
+    schemas = registered_schemas() if schemas is None else schemas
+    entries = {}
+    for schema in schemas:
+        try:
+            fingerprint = schema_fingerprint(schema, maker)
+            body = _encoded_body(maker, schema)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Cannot make schema for %s", schema)
+            continue
+        entries[schema.__identifier__] = {
+            'fingerprint': fingerprint,
+            'body': body.decode('utf-8'),
+        }
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'hash': _content_hash(entries),
+        'schemas': entries,
+    }
+    data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    with open(path, 'wb') as fp:
+        fp.write(zlib.compress(data.encode('utf-8')))
+    return len(entries)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, 'rb') as fp:
+            data = json.loads(zlib.decompress(fp.read()).decode('utf-8'))
+    except (IOError, OSError, ValueError, zlib.error):
+        logger.warning("Cannot read schema snapshot %s", path)
+        return None
+    if     not isinstance(data, dict) \
+        or data.get('version') != SNAPSHOT_VERSION \
+        or data.get('hash') != _content_hash(data.get('schemas') or {}):
+        logger.warning("Ignoring invalid schema snapshot %s", path)
+        return None
+    return data['schemas']
+
+
+def load_snapshot(path, schemas=None, maker=None):
+    """
+    Install the schemas in the snapshot file into the maker, skipping
+    those whose interface definition changed since the snapshot
+    was written.
+
+    :return: The list of the given interfaces (by default, all registered
+        interfaces) that were not installed, because they are missing from
+        the snapshot or are stale.
+    """
+    maker = component.getUtility(IObjectJsonSchemaMaker) if maker is None else maker
+    schemas = registered_schemas() if schemas is None else list(schemas)
+    entries = _read_snapshot(path) or {}
+    wanted = {s.__identifier__: s for s in schemas}
+    installed = set()
+    for identifier, entry in entries.items():
+        schema = wanted.get(identifier)
+        if schema is None:
+            continue
+        try:
+            fingerprint = schema_fingerprint(schema, maker)
+        except TypeError:
+            logger.exception("Cannot fingerprint %s", identifier)
+            continue
+        if entry['fingerprint'] != fingerprint:
+            logger.debug("Stale schema snapshot for %s", identifier)
+            continue
+        maker.install_snapshot(schema, entry['body'].encode('utf-8'))
+        installed.add(identifier)
+    return [s for s in schemas if s.__identifier__ not in installed]
+
+
+def ensure_snapshot(path, schemas=None, maker=None):
+    """
+    Load the snapshot file, rewriting it if it is missing, invalid
+    or stale.
+
+    :return: True if the snapshot was rewritten.
+    """
+    maker = component.getUtility(IObjectJsonSchemaMaker) if maker is None else maker
+    schemas = registered_schemas() if schemas is None else list(schemas)
+    missing = load_snapshot(path, schemas, maker) if os.path.exists(path) else True
+    if missing:
+        dump_snapshot(path, schemas, maker)
+        return True
+    return False
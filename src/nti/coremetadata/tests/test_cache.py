@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import is_not
+from hamcrest import has_entries
+from hamcrest import assert_that
+does_not = is_not
+
+import unittest
+
+from nti.coremetadata.cache import LRUCache
+from nti.coremetadata.cache import IdentityCache
+
+
+class TestCache(unittest.TestCase):
+
+    def test_lru(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+        cache = LRUCache(2)
+        assert_that(cache.hit_rate, is_(0.0))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert_that(cache.get('a'), is_(1))
+        # b is now the least recently used
+        cache.set('c', 3)
+        assert_that('b' in cache, is_(False))
+        assert_that(cache.get('b'), is_(none()))
+        assert_that(len(cache), is_(2))
+        assert_that(cache.stats(),
+                    has_entries('hits', 1,
+                                'misses', 1,
+                                'evictions', 1,
+                                'hit_rate', 0.5,
+                                'size', 2,
+                                'maxsize', 2))
+
+        assert_that(cache.invalidate('a'), is_(1))
+        assert_that(cache.invalidate('a'), is_(none()))
+        cache.clear()
+        assert_that(len(cache), is_(0))
+        cache.reset_stats()
+        assert_that(cache.stats(), has_entries('hits', 0, 'misses', 0))
+
+    def test_weight(self):
+        with self.assertRaises(ValueError):
+            LRUCache(2, maxweight=0)
+
+        cache = LRUCache(10, maxweight=10)
+        cache.set('a', 1, weight=4)
+        cache.set('b', 2, weight=4)
+        cache.set('a', 1, weight=5)
+        assert_that(cache.weight, is_(9))
+        # a is now the most recently used; b goes to make room
+        cache.set('c', 3, weight=3)
+        assert_that('b' in cache, is_(False))
+        assert_that(cache.weight, is_(8))
+        # Too heavy to store
+        cache.set('d', 4, weight=11)
+        assert_that('d' in cache, is_(False))
+        assert_that(cache.stats(),
+                    has_entries('weight', 8,
+                                'maxweight', 10,
+                                'evictions', 1))
+        cache.invalidate('a')
+        assert_that(cache.weight, is_(3))
+        cache.clear()
+        assert_that(cache.weight, is_(0))
+
+    def test_identity(self):
+        class Key(object):
+            # Equal to each other, like interfaces with the same name
+            __eq__ = lambda self, other: True
+            __hash__ = lambda self: 0
+        a, b = Key(), Key()
+
+        cache = IdentityCache(10)
+        assert_that(cache.lookup((a,)), is_(none()))
+        assert_that(cache.store((a,), 1), is_(1))
+        cache.store((a,), 2, extra='extra')
+        assert_that(cache.lookup((a,)), is_(1))
+        assert_that(cache.lookup((a,), 'extra'), is_(2))
+        assert_that(cache.lookup((b,), default=3), is_(3))
+        assert_that(cache.stats(), has_entries('hits', 2, 'misses', 2))
+
+        # An entry for another object with the same id is a miss
+        cache.set(cache._key((b,), None), ((a,), 4))
+        assert_that(cache.lookup((b,)), is_(none()))
+        assert_that(cache.stats(), has_entries('hits', 2, 'misses', 3))
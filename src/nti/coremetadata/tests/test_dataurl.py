@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import is_not
+from hamcrest import has_key
+from hamcrest import assert_that
+does_not = is_not
+
+import io
+import pickle
+import unittest
+
+from nti.property.dataurl import encode
+from nti.property.dataurl import DataURL
+
+from nti.coremetadata.dataurl import LazyDataURL
+from nti.coremetadata.dataurl import is_data_header
+
+
+class TestDataURL(unittest.TestCase):
+
+    def test_base64(self):
+        raw = bytes(bytearray(range(256))) * 10
+        url = LazyDataURL(encode(raw, 'image/png'))
+        assert_that(url.mimeType, is_('image/png'))
+        assert_that(url.is_base64, is_(True))
+        assert_that(url.__dict__, does_not(has_key('_v_data')))
+
+        fp = io.BytesIO()
+        assert_that(url.write_to(fp, chunk_size=10), is_(len(raw)))
+        assert_that(fp.getvalue(), is_(raw))
+        assert_that(url.__dict__, does_not(has_key('_v_data')))
+
+        assert_that(url.data, is_(raw))
+        assert_that(url.payload.tobytes(), is_(raw))
+        # Once decoded, chunks come from the payload
+        assert_that(b''.join(bytes(x) for x in url.iter_decoded(100)),
+                    is_(raw))
+
+        copy = pickle.loads(pickle.dumps(url))
+        assert_that(copy, is_(url))
+        assert_that(copy.__dict__, does_not(has_key('_v_data')))
+
+    def test_base64_whitespace(self):
+        raw = bytes(bytearray(range(256))) * 10
+        encoded = encode(raw, 'image/png')
+        header, payload = encoded.split(',', 1)
+        wrapped = '\r\n'.join(payload[i:i + 76]
+                               for i in range(0, len(payload), 76))
+        url = LazyDataURL(header + ',' + wrapped)
+        fp = io.BytesIO()
+        assert_that(url.write_to(fp, chunk_size=10), is_(len(raw)))
+        assert_that(fp.getvalue(), is_(raw))
+        assert_that(url.data, is_(DataURL(url).data))
+
+    def test_plain(self):
+        url = LazyDataURL('data:,a%20b')
+        assert_that(url.mimeType, is_('text/plain;charset=US-ASCII'))
+        assert_that(url.is_base64, is_(False))
+        # Like DataURL, a native string
+        assert_that(url.data, is_('a b'))
+        assert_that(url.data, is_(DataURL(url).data))
+        assert_that(url.payload.tobytes(), is_(b'a b'))
+
+    def test_invalid(self):
+        assert_that(is_data_header('data:image/gif;base64,R0lG'), is_(True))
+        assert_that(is_data_header('http://example.com'), is_(False))
+        with self.assertRaises(ValueError):
+            LazyDataURL('http://example.com').mimeType
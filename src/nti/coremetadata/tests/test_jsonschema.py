@@ -12,9 +12,13 @@ from hamcrest import none
 from hamcrest import is_not
 from hamcrest import has_key
 from hamcrest import has_entry
+from hamcrest import has_entries
 from hamcrest import assert_that
+from hamcrest import starts_with
+from hamcrest import same_instance
 does_not = is_not
 
+import json
 import unittest
 
 from zope import component
@@ -25,8 +29,17 @@ from zope.schema import vocabulary
 from nti.base.interfaces import ILastModified
 
 from nti.coremetadata.interfaces import IObjectJsonSchemaMaker
+from nti.coremetadata.interfaces import IObjectJsonSchemaUserOverlay
 
+from nti.coremetadata.jsonschema import EncodedSchema
+from nti.coremetadata.jsonschema import LazyFieldSchemas
+from nti.coremetadata.jsonschema import DefaultObjectJsonSchemaMaker
 from nti.coremetadata.jsonschema import CoreJsonSchemafier
+from nti.coremetadata.jsonschema import clear_caches
+from nti.coremetadata.jsonschema import get_field_plan
+
+from nti.coremetadata.utils import make_schema
+from nti.coremetadata.utils import make_lazy_schema
 
 from nti.coremetadata.tests import SharedConfiguringTestLayer
 
@@ -57,6 +70,177 @@ class TestJsonSchema(unittest.TestCase):
         assert_that(result,
                     has_entry('Fields', has_key('abs')))
 
+    def test_make_schemas(self):
+        class IBase(ILastModified):
+            abs = Number()
+
+        class IOne(IBase):
+            one = TextLine()
+
+        class ITwo(IBase):
+            two = ListOrTuple(TextLine())
+
+        maker = component.getUtility(IObjectJsonSchemaMaker)
+        result = maker.make_schemas((IOne, ITwo))
+        assert_that(result, has_key(IOne))
+        assert_that(result, has_key(ITwo))
+        one = result[IOne]['Fields']
+        two = result[ITwo]['Fields']
+        assert_that(sorted(one), is_(['abs', 'one']))
+        assert_that(sorted(two), is_(['abs', 'two']))
+        # inherited fields are computed once, but not shared
+        assert_that(one['abs'], is_(two['abs']))
+        assert_that(one['abs'], is_not(same_instance(two['abs'])))
+        assert_that(one['abs'], is_(maker.make_schema(IBase)['Fields']['abs']))
+
+        # changes made while post processing are not shared
+        class Schemafier(CoreJsonSchemafier):
+            def post_process_field(self, name, field, item_schema):
+                if self.schema is IOne:
+                    item_schema['readonly'] = True
+
+        class Maker(DefaultObjectJsonSchemaMaker):
+            maker = Schemafier
+
+        result = Maker().make_schemas((IOne, ITwo))
+        assert_that(result[IOne]['Fields']['abs'], has_entry('readonly', True))
+        assert_that(result[ITwo]['Fields']['abs'], has_entry('readonly', False))
+
+        # disallowed fields are remembered too
+        schemafier = CoreJsonSchemafier(IOne, field_cache={})
+        hidden = TextLine(__name__='_hidden')
+        assert_that(schemafier._make_field_schema(hidden), is_(none()))
+        assert_that(schemafier._make_field_schema(hidden), is_(none()))
+
+    def test_encoded_schema(self):
+        class IModel(ILastModified):
+            abs = Number()
+
+        maker = component.getUtility(IObjectJsonSchemaMaker)
+        encoded = maker.make_encoded_schema(IModel)
+        assert_that(encoded, is_(EncodedSchema))
+        assert_that(maker.make_encoded_schema(IModel), is_(same_instance(encoded)))
+        assert_that(json.loads(encoded.body.decode('utf-8')),
+                    is_(maker.make_schema(IModel)))
+        assert_that(len(encoded), is_(len(encoded.body)))
+        assert_that(encoded.etag, starts_with('"'))
+
+        assert_that(encoded.matches(None), is_(False))
+        assert_that(encoded.matches('"abc"'), is_(False))
+        assert_that(encoded.matches('*'), is_(True))
+        assert_that(encoded.matches('"abc", W/' + encoded.etag), is_(True))
+
+    def test_user_overlay(self):
+        class IModel(ILastModified):
+            abs = Number()
+            name = TextLine()
+            secret = TextLine()
+
+        class IShinigami(interface.Interface):
+            pass
+
+        @interface.implementer(IShinigami)
+        class Shinigami(object):
+            pass
+
+        @interface.implementer(IObjectJsonSchemaUserOverlay)
+        class ReadOnly(object):
+            def __init__(self, unused_user):
+                pass
+
+            def overrides(self, unused_schema):
+                return {'name': {'readonly': True},
+                        'secret': {'readonly': True},
+                        'missing': {'readonly': True}}
+
+        @interface.implementer(IObjectJsonSchemaUserOverlay)
+        class Hidden(ReadOnly):
+            def overrides(self, unused_schema):
+                return {'name': {'required': True},
+                        'secret': None}
+
+        maker = component.getUtility(IObjectJsonSchemaMaker)
+        gsm = component.getGlobalSiteManager()
+        for factory in (ReadOnly, Hidden):
+            gsm.registerSubscriptionAdapter(factory, (IShinigami,),
+                                            IObjectJsonSchemaUserOverlay)
+        try:
+            base = maker.make_schema(IModel)
+            result = maker.make_schema(IModel, Shinigami())
+            fields = result['Fields']
+            assert_that(sorted(fields), is_(['abs', 'name']))
+            assert_that(fields['name'],
+                        has_entries('readonly', True, 'required', True))
+            assert_that(fields['abs'], is_(base['Fields']['abs']))
+
+            # other users do not pay for overlays
+            assert_that(maker.make_schema(IModel, object()), is_(base))
+            assert_that(maker.make_encoded_schema(IModel, object()),
+                        is_(same_instance(maker.make_encoded_schema(IModel))))
+
+            encoded = maker.make_encoded_schema(IModel, Shinigami())
+            assert_that(json.loads(encoded.body.decode('utf-8')), is_(result))
+
+            batch = maker.make_schemas((IModel,), Shinigami())
+            assert_that(batch[IModel], is_(result))
+
+            result = make_schema(IModel, user=Shinigami())
+            assert_that(sorted(result['Fields']), is_(['abs', 'name']))
+            assert_that(make_schema(IModel), is_(base))
+            # From the cache, each result is a private copy
+            result = make_schema(IModel, user=Shinigami())
+            assert_that(result['Fields']['name'],
+                        has_entries('readonly', True, 'required', True))
+            abs_schema = make_schema(IModel, user=Shinigami())['Fields']['abs']
+            assert_that(result['Fields']['abs'],
+                        is_not(same_instance(abs_schema)))
+            result['Fields']['abs']['readonly'] = True
+            result['Fields']['name']['readonly'] = False
+            del result['Fields']['abs']
+            assert_that(make_schema(IModel), is_(base))
+            assert_that(make_schema(IModel)['Fields']['abs'],
+                        has_entries('readonly', False))
+        finally:
+            for factory in (ReadOnly, Hidden):
+                gsm.unregisterSubscriptionAdapter(factory, (IShinigami,),
+                                                  IObjectJsonSchemaUserOverlay)
+
+    def test_lazy_schema(self):
+        class IModel(ILastModified):
+            abs = Number()
+            name = TextLine()
+
+            def method():  # pylint: disable=no-method-argument
+                "A method"
+
+        maker = component.getUtility(IObjectJsonSchemaMaker)
+        full = maker.make_schema(IModel)['Fields']
+        lazy = maker.make_lazy_schema(IModel)['Fields']
+        assert_that(sorted(lazy), is_(['abs', 'name']))
+        assert_that(len(lazy), is_(2))
+        assert_that('abs' in lazy, is_(True))
+        assert_that(lazy._computed, is_({}))
+        assert_that(lazy['abs'], is_(full['abs']))
+        assert_that(lazy['abs'], is_(same_instance(lazy['abs'])))
+        assert_that(sorted(lazy._computed), is_(['abs']))
+        assert_that(dict(lazy), is_(full))
+        with self.assertRaises(KeyError):
+            lazy['method']  # pylint: disable=pointless-statement
+
+        lazy['other'] = {}
+        del lazy['name']
+        assert_that(sorted(lazy), is_(['abs', 'other']))
+        with self.assertRaises(KeyError):
+            del lazy['name']
+
+        lazy = make_lazy_schema(IModel, user=object())['Fields']
+        assert_that(lazy, is_(LazyFieldSchemas))
+
+        # Snapshots are already built
+        maker = DefaultObjectJsonSchemaMaker()
+        maker.install_snapshot(IModel, maker.make_encoded_schema(IModel).body)
+        assert_that(maker.make_lazy_schema(IModel), is_({'Fields': full}))
+
     def test_allow_fields(self):
         class IModel(ILastModified):
             abs = Number()
@@ -66,6 +250,33 @@ class TestJsonSchema(unittest.TestCase):
         assert_that(schemafier.allow_field('lastModified', IModel['lastModified']),
                     is_(False))
 
+    def test_field_plan(self):
+        class IModel(ILastModified):
+            abs = Number()
+            hidden = Number()
+            hidden.setTaggedValue('_ext_excluded_out', True)
+            _private = Number()
+        schemafier = CoreJsonSchemafier(IModel)
+        plan = schemafier.field_plan
+        assert_that(plan.allowed, is_(frozenset(['abs'])))
+        assert_that('abs' in plan, is_(True))
+        assert_that(get_field_plan(IModel, CoreJsonSchemafier), is_(plan))
+        assert_that(schemafier.field_plan, is_(plan))
+
+        # same name, different interface
+        class IOther(interface.Interface):
+            abs = Number()
+            abs.setTaggedValue('_ext_excluded_out', True)
+        assert_that(schemafier.allow_field('abs', IOther['abs']),
+                    is_(False))
+        # nested fields have no name
+        assert_that(schemafier.allow_field('', Number()), is_(True))
+
+        # bound clones use the plan of their own schema
+        clone = schemafier.bind(IOther)
+        assert_that(clone.field_plan.schema, is_(IOther))
+        assert_that(clone.make_schema(), is_({}))
+
     def test_process_object(self):
         class ISpirit(interface.Interface):
             pass
@@ -106,6 +317,32 @@ class TestJsonSchema(unittest.TestCase):
         assert_that(schemafier.get_ui_types_from_field(I3['obj']),
                     is_(('Variant', 'Variant')))
 
+    def test_variant_cache(self):
+        class ISpirit(interface.Interface):
+            pass
+
+        class I1(interface.Interface):
+            obj = Variant((Object(ISpirit), TextLine()))
+        clear_caches()
+        schemafier = CoreJsonSchemafier(I1)
+        first = schemafier.process_variant(I1['obj'], 'Variant')
+        assert_that(first, is_(['string', 'spirit']))
+        # callers get their own list
+        first.append('hollow')
+        second = schemafier.process_variant(I1['obj'], 'Variant')
+        assert_that(second, is_(['string', 'spirit']))
+
+        # resolved once per field, not per schemafier
+        class Counting(CoreJsonSchemafier):
+            calls = 0
+
+            def resolve_variant(self, field, ui_type):
+                Counting.calls += 1
+                return CoreJsonSchemafier.resolve_variant(self, field, ui_type)
+        Counting(I1).process_variant(I1['obj'], 'Variant')
+        Counting(I1).get_ui_types_from_field(I1['obj'])
+        assert_that(Counting.calls, is_(1))
+
     def test_process_list(self):
         class I1(interface.Interface):
             obj = ListOrTuple(TextLine())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import assert_that
+
+from nti.testing.matchers import verifiably_provides
+
+import fudge
+
+import unittest
+
+import BTrees
+
+from zope import component
+from zope import interface
+
+from zope.event import notify
+
+from zope.intid.interfaces import IIntIds
+from zope.intid.interfaces import IntIdAddedEvent
+from zope.intid.interfaces import IntIdRemovedEvent
+
+from nti.contentfragments.interfaces import PlainTextContentFragment
+from nti.contentfragments.interfaces import SanitizedHTMLContentFragment
+
+from nti.coremetadata.mentions.extraction import extract_mentions
+from nti.coremetadata.mentions.extraction import iter_mentioned_usernames
+
+from nti.coremetadata.mentions.index import MentionIndex
+
+from nti.coremetadata.mentions.interfaces import IMentionIndex
+
+from nti.coremetadata.mentions.schema import Mention
+
+from nti.coremetadata.mixins import MentionableMixin
+
+from nti.coremetadata.tests import SharedConfiguringTestLayer
+
+
+class TestMention(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def test_constraint(self):
+        field = Mention()
+        assert_that(field.constraint(u'user1'), is_(True))
+        assert_that(field.constraint(u' user1 '), is_(True))
+        for value in (u'', u'  ', u'user 1', u'user\t1', u'user　1', u'user\n1'):
+            assert_that(field.constraint(value), is_(False))
+
+
+class TestExtraction(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def test_iter_usernames(self):
+        text = u'Hi @Robert, @tony. Mail bob@example.com or @@nobody, @-'
+        assert_that(list(iter_mentioned_usernames(text)),
+                    is_([u'Robert', u'tony']))
+        assert_that(list(iter_mentioned_usernames(text.encode('utf-8'))),
+                    is_([u'Robert', u'tony']))
+        assert_that(list(iter_mentioned_usernames(None)), is_([]))
+
+    def test_iter_html_and_parts(self):
+        html = SanitizedHTMLContentFragment(
+            u'<p>See <a href="mailto:@robert">@tony</a> <b\n>@ann.b</b></p>'
+        )
+        unclosed = SanitizedHTMLContentFragment(u'@zed <unclosed @amy')
+        body = (html, object(), unclosed, b'<b>@bob</b>')
+        assert_that(list(iter_mentioned_usernames(body)),
+                    is_([u'tony', u'ann.b', u'zed', u'amy', u'bob']))
+
+    def test_iter_plain_text(self):
+        # Only HTML has tags
+        text = PlainTextContentFragment(u'if a < b then @tony > c')
+        assert_that(list(iter_mentioned_usernames(text)), is_([u'tony']))
+        text = PlainTextContentFragment(u'I <3 @tony and >_< @ann')
+        assert_that(list(iter_mentioned_usernames(text)),
+                    is_([u'tony', u'ann']))
+        assert_that(list(iter_mentioned_usernames(u'I <3 @tony and >_< @ann')),
+                    is_([u'tony', u'ann']))
+
+    def test_extract(self):
+        body = (u'@Robert and @robert and @tony', u'@ROBERT, @ann!')
+        assert_that(extract_mentions(body),
+                    is_((u'robert', u'tony', u'ann')))
+        assert_that(extract_mentions(u'no mentions'), is_(()))
+
+    def test_extract_invalid(self):
+        field = Mention(min_length=1, max_length=4)
+        assert_that(extract_mentions(u'@toolong @tony @amy', field),
+                    is_((u'tony', u'amy')))
+
+    def test_extract_normalized(self):
+        # Converting may make distinct usernames equal
+        class Field(Mention):
+            def fromUnicode(self, value):
+                return super(Field, self).fromUnicode(value.rstrip(u'_'))
+        field = Field(min_length=1)
+        assert_that(extract_mentions(u'@amy_ @amy @tony', field),
+                    is_((u'amy', u'tony')))
+        assert_that(extract_mentions(u'@amy @amy_ @tony', field),
+                    is_((u'amy', u'tony')))
+
+
+def _mentions(*usernames):
+    return tuple(PlainTextContentFragment(x) for x in usernames)
+
+
+@interface.implementer(IIntIds)
+class IntIds(object):
+
+    def __init__(self):
+        self.ids = {}
+
+    def queryId(self, obj, default=None):
+        return self.ids.get(id(obj), default)
+
+
+class TestMentionIndex(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def test_index(self):
+        index = MentionIndex()
+        assert_that(index, verifiably_provides(IMentionIndex))
+        index.index_doc(1, (u'Robert', u'tony'))
+        index.index_doc(2, (u'tony',))
+        index.index_doc(3, ())
+        assert_that(index.documentCount(), is_(2))
+        assert_that(index.wordCount(), is_(2))
+        assert_that(list(index.apply(u'TONY')), is_([1, 2]))
+        assert_that(list(index.apply((u'robert', u'ann'))), is_([1]))
+        assert_that(list(index.apply(u'ann')), is_([]))
+        assert_that(list(index.mentioning(fudge.Fake().has_attr(username=u'robert'))),
+                    is_([1]))
+        assert_that(index.mentionsOf(1), is_((u'robert', u'tony')))
+
+        # Reindexing applies the difference
+        index.index_doc(1, (u'ann', u'tony'))
+        index.index_doc(1, (u'tony', u'ann'))
+        assert_that(list(index.apply(u'robert')), is_([]))
+        assert_that(list(index.apply(u'ann')), is_([1]))
+        assert_that(index.wordCount(), is_(2))
+
+        index.reindex_doc(1, added=(u'Bob',), removed=(u'tony',))
+        index.reindex_doc(4, added=(u'bob',))
+        assert_that(index.mentionsOf(1), is_((u'ann', u'bob')))
+        assert_that(list(index.apply(u'bob')), is_([1, 4]))
+        assert_that(list(index.apply(u'tony')), is_([2]))
+        index.reindex_doc(4, removed=(u'bob',))
+        assert_that(index.documentCount(), is_(2))
+
+        index.index_doc(2, None)
+        index.unindex_doc(2)
+        assert_that(index.documentCount(), is_(1))
+        assert_that(index.mentionsOf(2), is_(()))
+        index.clear()
+        assert_that(index.documentCount(), is_(0))
+
+    def test_events(self):
+        index = MentionIndex()
+        intids = IntIds()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(index, IMentionIndex)
+        gsm.registerUtility(intids, IIntIds)
+        try:
+            obj = MentionableMixin()
+            obj.mentions = _mentions(u'robert')
+            # Not indexed without an intid
+            assert_that(index.documentCount(), is_(0))
+
+            intids.ids[id(obj)] = 42
+            notify(IntIdAddedEvent(obj, None))
+            notify(IntIdAddedEvent(object(), None))
+            assert_that(list(index.mentioning(u'robert')), is_([42]))
+
+            obj.mentions = _mentions(u'tony')
+            assert_that(list(index.mentioning(u'robert')), is_([]))
+            assert_that(list(index.mentioning(u'tony')), is_([42]))
+
+            notify(IntIdRemovedEvent(obj, None))
+            notify(IntIdRemovedEvent(object(), None))
+            assert_that(index.documentCount(), is_(0))
+        finally:
+            gsm.unregisterUtility(index, IMentionIndex)
+            gsm.unregisterUtility(intids, IIntIds)
+        # Without an index nothing happens
+        obj.mentions = _mentions(u'ann')
+        notify(IntIdRemovedEvent(obj, None))
+
+    def test_first_index(self):
+        # An object with mentions, not yet in the index
+        obj = MentionableMixin()
+        obj.mentions = _mentions(u'robert', u'ann')
+        index = MentionIndex(family=BTrees.family32)
+        intids = IntIds()
+        intids.ids[id(obj)] = 42
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(index, IMentionIndex)
+        gsm.registerUtility(intids, IIntIds)
+        try:
+            obj.mentions = _mentions(u'robert', u'ann', u'tony')
+            assert_that(index.mentionsOf(42), is_((u'ann', u'robert', u'tony')))
+            obj.mentions = _mentions(u'tony')
+            assert_that(index.mentionsOf(42), is_((u'tony',)))
+            assert_that(list(index.mentioning(u'ann')), is_([]))
+        finally:
+            gsm.unregisterUtility(index, IMentionIndex)
+            gsm.unregisterUtility(intids, IIntIds)
@@ -9,6 +9,7 @@ from __future__ import absolute_import
 import fudge
 from hamcrest import calling
 from hamcrest import contains
+from hamcrest import has_key
 from hamcrest import has_item
 from hamcrest import has_length
 from hamcrest import instance_of
@@ -17,9 +18,12 @@ from hamcrest import none
 from hamcrest import is_not
 from hamcrest import assert_that
 from hamcrest import has_property
+from hamcrest import has_properties
 from hamcrest import raises
+from hamcrest import same_instance
 from hamcrest.core.core import isinstanceof
 from nti.coremetadata.interfaces import IMentionable
+from nti.coremetadata.mentions.interfaces import IMentionsModifiedEvent
 from nti.coremetadata.mentions.schema import Mention
 from nti.coremetadata.mixins import MentionableMixin
 
@@ -32,8 +36,11 @@ does_not = is_not
 from nti.testing.matchers import validly_provides
 from nti.testing.matchers import verifiably_provides
 
+import pickle
 import unittest
 
+import zope.event
+
 from zope.location.interfaces import IContained as IZContained
 
 from nti.coremetadata.interfaces import IContained
@@ -104,3 +111,64 @@ class TestMentionableMixin(unittest.TestCase):
         assert_that(m.isMentionedDirectly(tony), is_(False))
         assert_that(m.isMentionedDirectly(tony.username), is_(False))
 
+
+    def test_mentioned_set(self):
+        m = MentionableMixin()
+        m.mentions = (PlainTextContentFragment(u"robert"),
+                      PlainTextContentFragment(u"tony"))
+        assert_that(m.isMentionedDirectly(u"tony"), is_(True))
+        mentions_set = m._mentions_set()
+        assert_that(m._mentions_set(), is_(same_instance(mentions_set)))
+        assert_that(m._v_mentions_set[0], is_(same_instance(m.mentions)))
+
+        # Replacing the mentions rebuilds the set
+        m.mentions = (PlainTextContentFragment(u"ann"),)
+        assert_that(m.isMentionedDirectly(u"tony"), is_(False))
+        assert_that(m.isMentionedDirectly(u"ann"), is_(True))
+
+    def test_pickle(self):
+        m = MentionableMixin()
+        m.mentions = (PlainTextContentFragment(u"robert"),)
+        assert_that(m.isMentionedDirectly(u"robert"), is_(True))
+        assert_that(m.__dict__, has_key('_v_mentions_set'))
+        # The cached set is not pickled
+        assert_that(m.__getstate__(), is_not(has_key('_v_mentions_set')))
+        clone = pickle.loads(pickle.dumps(m))
+        assert_that(clone.__dict__, is_not(has_key('_v_mentions_set')))
+        assert_that(clone.isMentionedDirectly(u"robert"), is_(True))
+        assert_that(MentionableMixin().__getstate__(),
+                    is_not(has_key('_v_mentions_set')))
+
+    def test_filter_mentioned(self):
+        m = MentionableMixin()
+        robert = fudge.Fake("User").has_attr(username="robert")
+        tony = fudge.Fake("User").has_attr(username="tony")
+        assert_that(m.filterMentionedDirectly([robert, u"tony"]), is_([]))
+
+        m.mentions = (PlainTextContentFragment(u"robert"),
+                      PlainTextContentFragment(u"tony"))
+        users = (x for x in (u"ann", tony, u"robert", robert, u"tony"))
+        assert_that(m.filterMentionedDirectly(users),
+                    contains(tony, u"robert", robert, u"tony"))
+
+    def test_mentions_modified(self):
+        events = []
+        zope.event.subscribers.append(events.append)
+        try:
+            m = MentionableMixin()
+            m.mentions = (PlainTextContentFragment(u"robert"),
+                          PlainTextContentFragment(u"tony"))
+            m.mentions = (PlainTextContentFragment(u"tony"),
+                          PlainTextContentFragment(u"ann"))
+            # Unchanged
+            m.mentions = (PlainTextContentFragment(u"ann"),
+                          PlainTextContentFragment(u"tony"))
+        finally:
+            zope.event.subscribers.remove(events.append)
+        events = [x for x in events if IMentionsModifiedEvent.providedBy(x)]
+        assert_that(events, has_length(2))
+        assert_that(events[0], has_properties('object', same_instance(m),
+                                              'added', {u"robert", u"tony"},
+                                              'removed', set()))
+        assert_that(events[1], has_properties('added', {u"ann"},
+                                              'removed', {u"robert"}))
@@ -8,21 +8,52 @@ from __future__ import absolute_import
 # pylint: disable=protected-access,too-many-public-methods,inherit-non-class
 
 from hamcrest import is_
+from hamcrest import none
 from hamcrest import is_not
+from hamcrest import has_key
+from hamcrest import has_length
+from hamcrest import has_property
+from hamcrest import same_instance
 from hamcrest import assert_that
+from hamcrest import has_entries
+from hamcrest import contains_string
 does_not = is_not
 
 import unittest
+import itertools
 
+from zope import event
+from zope import component
 from zope import interface
 
+from zope.component.hooks import setHooks
+from zope.component.hooks import resetHooks
+from zope.component.hooks import site as current_site
+
+from zope.interface.registry import Components
+
+from zope.schema.interfaces import TooLong
+from zope.schema.interfaces import WrongType
 from zope.schema.interfaces import InvalidURI
 from zope.schema.interfaces import ValidationError
 
+from nti.contentfragments.interfaces import UnicodeContentFragment
+from nti.contentfragments.interfaces import IAllowedAttributeProvider
+
+from nti.coremetadata.dataurl import LazyDataURL
+
 from nti.coremetadata.schema import DataURI
+from nti.coremetadata.schema import LazyDataURI
 from nti.coremetadata.schema import bodySchemaField
 from nti.coremetadata.schema import BodyFieldProperty
 from nti.coremetadata.schema import AbstractFieldProperty
+from nti.coremetadata.schema import convert_body_part
+from nti.coremetadata.schema import DispatchingVariant
+from nti.coremetadata.schema import UnicodeConvertingFieldProperty
+from nti.coremetadata.schema import legacyModeledContentBodyTypes
+from nti.coremetadata.schema import trusted_assignment
+from nti.coremetadata.schema import body_part_cache_stats
+from nti.coremetadata.schema import clear_body_part_cache
 from nti.coremetadata.schema import CompoundModeledContentBody
 from nti.coremetadata.schema import MessageInfoBodyFieldProperty
 from nti.coremetadata.schema import ExtendedCompoundModeledContentBody
@@ -30,11 +61,32 @@ from nti.coremetadata.schema import ExtendedCompoundModeledContentBody
 from nti.coremetadata.tests import SharedConfiguringTestLayer
 
 from nti.schema.field import Number
+from nti.schema.field import Object
+from nti.schema.field import Variant
+from nti.schema.field import TextLine
+from nti.schema.field import DecodingValidTextLine
 from nti.schema.field import ListOrTupleFromObject
 
 from nti.schema.interfaces import VariantValidationError
 
 
+class IFirst(interface.Interface):
+    pass
+
+
+class ISecond(interface.Interface):
+    pass
+
+
+class CountingObject(Object):
+
+    validations = 0
+
+    def validate(self, value):
+        CountingObject.validations += 1
+        super(CountingObject, self).validate(value)
+
+
 class TestSchema(unittest.TestCase):
 
     layer = SharedConfiguringTestLayer
@@ -45,10 +97,42 @@ class TestSchema(unittest.TestCase):
         with self.assertRaises(InvalidURI):
             m._validate('urn:isbn:0-395-36341-1')
 
+    def test_lazy_data_uri(self):
+        field = LazyDataURI()
+        value = field.fromUnicode(u' data:image/gif;base64,R0lGODlh ')
+        assert_that(value, is_(LazyDataURL))
+        assert_that(field.fromUnicode(value), is_(same_instance(value)))
+        assert_that(value.mimeType, is_('image/gif'))
+        with self.assertRaises(InvalidURI):
+            field.validate('urn:isbn:0-395-36341-1')
+
     def test_extended_compound_modeled_content_body(self):
         field = ExtendedCompoundModeledContentBody()
         assert_that(field, is_(ListOrTupleFromObject))
 
+    def test_shared_body_fields(self):
+        first = CompoundModeledContentBody()
+        second = CompoundModeledContentBody(required=True)
+        assert_that(first, is_not(same_instance(second)))
+        assert_that(first.value_type, is_(same_instance(second.value_type)))
+        assert_that(ExtendedCompoundModeledContentBody().value_type,
+                    is_(same_instance(ExtendedCompoundModeledContentBody().value_type)))
+        assert_that(CompoundModeledContentBody(dispatch=True).value_type,
+                    is_not(same_instance(first.value_type)))
+
+        types = legacyModeledContentBodyTypes()
+        assert_that(types[0], is_not(same_instance(legacyModeledContentBodyTypes()[0])))
+        assert_that(types[0], is_not(same_instance(first.value_type.fields[0])))
+        # Building variants of the returned fields does not rename shared ones
+        Variant(types, __name__='attachment')
+        assert_that(first.value_type.fields[0], has_property('__name__', 'body'))
+        # The given fields are not modified
+        field = ExtendedCompoundModeledContentBody(fields=types)
+        assert_that(types, has_length(4))
+        assert_that(field.value_type.fields, has_length(6))
+        assert_that(ExtendedCompoundModeledContentBody(fields=types).value_type,
+                    is_(same_instance(field.value_type)))
+
     def test_model(self):
         class IModel(interface.Interface):
             abs = bodySchemaField(fields=(Number(),))
@@ -74,3 +158,339 @@ class TestSchema(unittest.TestCase):
             m.abs = []
         with self.assertRaises(VariantValidationError):
             m.abs = [()]
+
+    def test_fast_paths(self):
+        class IModel(interface.Interface):
+            abs = bodySchemaField(fields=(Number(),))
+            body = CompoundModeledContentBody()
+
+        @interface.implementer(IModel)
+        class Model(object):
+            abs = AbstractFieldProperty(IModel['abs'])
+            body = BodyFieldProperty(IModel['body'])
+
+        validations = []
+        value_type = IModel['body'].value_type
+        value_type.validate = lambda value: validations.append(value)
+
+        m = Model()
+        # Raw strings are adapted before validating, and the
+        # converted parts are not validated again
+        m.body = [u'aizen', b'ichigo']
+        body = m.body
+        assert_that(body, has_length(2))
+        assert_that(type(body[0]), is_not(type(u'')))
+        assert_that(validations, is_([]))
+        del value_type.validate
+
+        # Reassigning the stored value still notifies
+        events = []
+        event.subscribers.append(events.append)
+        try:
+            m.body = body
+        finally:
+            event.subscribers.remove(events.append)
+        assert_that(m.body, is_(same_instance(body)))
+        assert_that(events, has_length(1))
+        # Already valid parts are validated without adapting
+        m.body = list(body)
+        assert_that(m.body, is_(body))
+        m.body = None
+
+        with trusted_assignment():
+            with trusted_assignment():
+                m.abs = (u'not a number',)
+            assert_that(m.abs, is_((u'not a number',)))
+        with self.assertRaises(ValidationError):
+            m.abs = [u'not a number']
+
+    def test_typed_values(self):
+        class IThing(interface.Interface):
+            size = Number()
+
+        class IModel(interface.Interface):
+            thing = Object(IThing)
+            things = ListOrTupleFromObject(value_type=Object(IThing))
+
+        @interface.implementer(IThing)
+        class Thing(object):
+            size = 1
+
+        adapted = []
+
+        class Property(AbstractFieldProperty):
+            def _adapt(self, value):
+                adapted.append(value)
+                return super(Property, self)._adapt(value)
+
+        @interface.implementer(IModel)
+        class Model(object):
+            thing = Property(IModel['thing'])
+            things = Property(IModel['things'])
+
+        m = Model()
+        m.thing = Thing()
+        m.things = [Thing(), Thing()]
+        assert_that(m.things, has_length(2))
+
+        # A stored mutable value is validated again when reassigned
+        stored = m.thing
+        stored.size = u'large'
+        with self.assertRaises(ValidationError):
+            m.thing = stored
+
+        # Values of the schema's type are not adapted when invalid
+        invalid = Thing()
+        invalid.size = u'large'
+        with self.assertRaises(ValidationError):
+            m.thing = invalid
+        with self.assertRaises(ValidationError):
+            m.things = (Thing(), invalid)
+        assert_that(adapted, is_([]))
+
+        # Other values are, even when they provide the schema
+        class Other(object):
+            size = u'large'
+        other = Other()
+        interface.alsoProvides(other, IThing)
+        with self.assertRaises(ValidationError):
+            m.things = (Thing(), other)
+        assert_that(adapted, has_length(1))
+
+    def test_readonly(self):
+        class IModel(interface.Interface):
+            abs = bodySchemaField(fields=(Number(),))
+        IModel['abs'].readonly = True
+
+        @interface.implementer(IModel)
+        class Model(object):
+            abs = AbstractFieldProperty(IModel['abs'])
+
+        m = Model()
+        m.abs = (1,)
+        with self.assertRaises(ValueError):
+            with trusted_assignment():
+                m.abs = (2,)
+
+    def test_set_many(self):
+        class IModel(interface.Interface):
+            body = CompoundModeledContentBody()
+
+        @interface.implementer(IModel)
+        class Model(object):
+            body = BodyFieldProperty(IModel['body'])
+
+        prop = Model.__dict__['body']
+        existing = Model()
+        existing.body = [u'shared']
+        part = existing.body[0]
+
+        objects = [Model() for _ in range(3)]
+        prop.set_many(zip(objects,
+                          ([u'shared', b'other'],
+                           (part, u'shared', UnicodeContentFragment(u'frag')),
+                           None)))
+        first, second, third = objects
+        assert_that(second.body[2], is_(u'frag'))
+        assert_that(type(second.body[2]), is_not(UnicodeContentFragment))
+        assert_that(first.body[0], is_(same_instance(second.body[1])))
+        assert_that(second.body[0], is_(same_instance(part)))
+        assert_that(first.body[1], is_(u'other'))
+        assert_that(third.body, is_(none()))
+
+        # Nothing is assigned if any value is invalid
+        fresh = Model()
+        with self.assertRaises(ValidationError):
+            prop.set_many([(fresh, [u'ok']), (Model(), [])])
+        assert_that(fresh.__dict__, does_not(has_key('body')))
+        with self.assertRaises(ValidationError):
+            prop.set_many([(fresh, u'not a sequence')])
+
+    def test_body_part_cache(self):
+        clear_body_part_cache()
+
+        class IModel(interface.Interface):
+            body = CompoundModeledContentBody()
+
+        @interface.implementer(IModel)
+        class Model(object):
+            body = BodyFieldProperty(IModel['body'])
+            msg = MessageInfoBodyFieldProperty(IModel['body'], 'msg')
+
+        first, second = Model(), Model()
+        first.body = [u'+1']
+        second.body = [b'+1']
+        first.msg = u'+1'
+        assert_that(second.body[0], is_(same_instance(first.body[0])))
+        assert_that(first.msg[0], is_(same_instance(first.body[0])))
+        assert_that(body_part_cache_stats(),
+                    has_entries('hits', 2, 'misses', 1, 'size', 1))
+        with self.assertRaises(ValidationError):
+            first.msg = 1
+
+        # Different value types do not share conversions
+        value_type = CompoundModeledContentBody(dispatch=True).value_type
+        convert_body_part(value_type, u'+1')
+        assert_that(body_part_cache_stats(),
+                    has_entries('misses', 2, 'size', 2))
+        assert_that(convert_body_part(value_type, first.body[0]),
+                    is_(same_instance(first.body[0])))
+
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(object(), interface.Interface, name=u'test_schema')
+        gsm.unregisterUtility(provided=interface.Interface, name=u'test_schema')
+        assert_that(body_part_cache_stats(), has_entries('size', 0))
+
+    def test_body_part_cache_sites(self):
+        @interface.implementer(IAllowedAttributeProvider)
+        class Provider(object):
+            allowed_attributes = ('data-mention',)
+
+        class Site(object):
+            def __init__(self):
+                gsm = component.getGlobalSiteManager()
+                self.site_manager = Components(bases=(gsm,))
+                self.site_manager.registerUtility(Provider(),
+                                                  IAllowedAttributeProvider)
+
+            def getSiteManager(self):
+                return self.site_manager
+
+        value_type = CompoundModeledContentBody().value_type
+        html = u'<html><body><p data-mention="tony">Hi</p></body></html>'
+        site = Site()
+        setHooks()
+        try:
+            plain = convert_body_part(value_type, html)
+            with current_site(site):
+                local = convert_body_part(value_type, html)
+            assert_that(convert_body_part(value_type, html),
+                        is_(same_instance(plain)))
+        finally:
+            resetHooks()
+        assert_that(plain, does_not(contains_string(u'data-mention')))
+        assert_that(local, contains_string(u'data-mention'))
+
+    def test_dispatching_variant(self):
+        field = ExtendedCompoundModeledContentBody(dispatch=True)
+        assert_that(field.value_type, is_(DispatchingVariant))
+        assert_that(CompoundModeledContentBody(dispatch=True).value_type,
+                    is_(DispatchingVariant))
+
+        class IModel(interface.Interface):
+            body = field
+
+        @interface.implementer(IModel)
+        class Model(object):
+            body = BodyFieldProperty(IModel['body'])
+
+        m = Model()
+        m.body = [u'aizen']
+        m.body = [m.body[0], b'ichigo']
+        assert_that(m.body, has_length(2))
+
+        @interface.implementer(ISecond)
+        class Second(object):
+            pass
+
+        variant = DispatchingVariant((CountingObject(IFirst),
+                                      CountingObject(ISecond)))
+        CountingObject.validations = 0
+        variant.validate(Second())
+        assert_that(CountingObject.validations, is_(1))
+        # A bound clone dispatches the same way
+        variant.bind(m).validate(Second())
+        assert_that(CountingObject.validations, is_(2))
+        with self.assertRaises(VariantValidationError):
+            variant.validate(object())
+
+        # The chosen field rejects the value; all are tried
+        variant = DispatchingVariant((TextLine(max_length=1), Number()))
+        with self.assertRaises(VariantValidationError):
+            variant.validate(u'too long')
+
+        # Undecidable fields
+        optional = Object(IFirst, required=False)
+        optional.missing_value = u''
+        variant = DispatchingVariant((optional, TextLine()))
+        variant.validate(u'')
+        variant = DispatchingVariant((Object(IFirst), Number()))
+        variant.fields[1]._type = None
+        variant.validate(1)
+
+    def test_streaming(self):
+        class IModel(interface.Interface):
+            abs = bodySchemaField(fields=(Number(),))
+            body = CompoundModeledContentBody()
+            limited = ListOrTupleFromObject(value_type=Number(), max_length=2)
+            plain = Variant((Number(),))
+            mixed = Variant((Number(), ListOrTupleFromObject(value_type=Number())))
+            names = ListOrTupleFromObject(value_type=TextLine())
+
+        @interface.implementer(IModel)
+        class Model(object):
+            abs = AbstractFieldProperty(IModel['abs'])
+            body = BodyFieldProperty(IModel['body'])
+            msg = MessageInfoBodyFieldProperty(IModel['body'], 'msg')
+            limited = AbstractFieldProperty(IModel['limited'])
+            plain = AbstractFieldProperty(IModel['plain'])
+            mixed = AbstractFieldProperty(IModel['mixed'])
+            names = AbstractFieldProperty(IModel['names'])
+
+        m = Model()
+        m.body = (x for x in (u'aizen', b'ichigo'))
+        assert_that(m.body, has_length(2))
+        m.msg = iter(m.body)
+        assert_that(m.msg, is_(m.body))
+        m.abs = (x for x in range(3))
+        assert_that(m.abs, is_((0, 1, 2)))
+
+        consumed = []
+
+        def parts():
+            for x in (1, u'not a number', 3):
+                consumed.append(x)
+                yield x
+        with self.assertRaises(ValidationError):
+            m.abs = parts()
+        # Stopped at the first invalid part
+        assert_that(consumed, is_([1, u'not a number']))
+
+        with self.assertRaises(TooLong):
+            m.limited = iter(range(10))
+        # Even when the iterator does not end
+        with self.assertRaises(TooLong):
+            m.limited = itertools.count()
+        with self.assertRaises(ValidationError):
+            m.body = iter(())
+
+        # Fields without a value type, and trusted assignments,
+        # only materialize the iterator
+        with self.assertRaises(ValidationError):
+            m.plain = iter((1,))
+        m.mixed = iter((1, 2))
+        assert_that(m.mixed, is_((1, 2)))
+
+        # Value types that cannot convert objects only validate
+        m.names = iter((u'aizen',))
+        assert_that(m.names, is_((u'aizen',)))
+        with self.assertRaises(WrongType):
+            m.names = iter((u'ichigo', 1))
+        with trusted_assignment():
+            m.abs = iter((u'x',))
+        assert_that(m.abs, is_((u'x',)))
+
+    def test_unicode_converting(self):
+        class IModel(interface.Interface):
+            name = DecodingValidTextLine(required=False)
+
+        @interface.implementer(IModel)
+        class Model(object):
+            name = UnicodeConvertingFieldProperty(IModel['name'])
+
+        m = Model()
+        m.name = b'aizen'
+        assert_that(m.name, is_(u'aizen'))
+        m.name = None
+        with self.assertRaises(ValidationError):
+            m.name = u'ai\nzen'
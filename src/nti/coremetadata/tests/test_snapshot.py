@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods,inherit-non-class
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import is_not
+from hamcrest import has_item
+from hamcrest import assert_that
+does_not = is_not
+
+import os
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from zope import component
+from zope import interface
+
+from zope.interface.interfaces import IInterface
+
+from zope.schema.vocabulary import SimpleVocabulary
+
+from nti.coremetadata.jsonschema import DefaultObjectJsonSchemaMaker
+
+from nti.coremetadata.snapshot import dump_snapshot
+from nti.coremetadata.snapshot import load_snapshot
+from nti.coremetadata.snapshot import ensure_snapshot
+from nti.coremetadata.snapshot import schema_fingerprint
+from nti.coremetadata.snapshot import registered_schemas
+from nti.coremetadata.snapshot import clear_fingerprint_cache
+
+from nti.coremetadata.tests import SharedConfiguringTestLayer
+
+from nti.schema.field import Choice
+from nti.schema.field import Number
+from nti.schema.field import Object
+from nti.schema.field import Variant
+from nti.schema.field import TextLine
+from nti.schema.field import ListOrTuple
+
+
+class ISnapshotted(interface.Interface):
+    abs = Number(title=u'abs')
+    var = Variant((Number(), TextLine()))
+
+
+class TestSnapshot(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'schemas.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fingerprint(self):
+        first = schema_fingerprint(ISnapshotted)
+        assert_that(schema_fingerprint(ISnapshotted), is_(first))
+
+        class ISnapshotted2(interface.Interface):
+            abs = Number(title=u'changed')
+        assert_that(schema_fingerprint(ISnapshotted2), is_not(first))
+
+    def test_fingerprint_nested(self):
+        class IPart(interface.Interface):
+            abs = Number(title=u'abs')
+
+        class IWhole(interface.Interface):
+            part = Object(IPart)
+            parts = ListOrTuple(value_type=Object(IPart))
+        first = schema_fingerprint(IWhole)
+
+        class IPart(interface.Interface):  # pylint: disable=function-redefined
+            abs = Number(title=u'changed')
+
+        class IWhole(interface.Interface):  # pylint: disable=function-redefined
+            part = Object(IPart)
+            parts = ListOrTuple(value_type=Object(IPart))
+        assert_that(schema_fingerprint(IWhole), is_not(first))
+
+    def test_fingerprint_cycle(self):
+        class INode(interface.Interface):
+            pass
+        INode.setTaggedValue('self', INode)
+        assert_that(schema_fingerprint(INode), is_(schema_fingerprint(INode)))
+
+    def test_fingerprint_values(self):
+        def make(vocabulary, tags):
+            class IChoices(interface.Interface):
+                choice = Choice(vocabulary=vocabulary)
+                other = TextLine(constraint=make)
+            interface.alsoProvides(IChoices['other'], IInterface)
+            for name, value in tags.items():
+                IChoices.setTaggedValue(name, value)
+            return schema_fingerprint(IChoices)
+
+        def vocabulary(*values):
+            return SimpleVocabulary.fromValues(values)
+
+        tags = {'map': {'a': 1}, 'set': {u'b', u'c'}, 'type': Number}
+        first = make(vocabulary(u'a', u'b'), tags)
+        assert_that(make(vocabulary(u'a', u'b'), tags), is_(first))
+        assert_that(make(vocabulary(u'a', u'c'), tags), is_not(first))
+        assert_that(make(vocabulary(u'a', u'b'), dict(tags, map={'a': 2})),
+                    is_not(first))
+        assert_that(make(vocabulary(u'a', u'b'), dict(tags, set={u'b'})),
+                    is_not(first))
+
+        # Values without a stable representation are not ignored
+        with self.assertRaises(TypeError):
+            make(vocabulary(u'a'), {'marker': object()})
+
+    def test_fingerprint_cached(self):
+        class IModel(interface.Interface):
+            abs = Number()
+        first = schema_fingerprint(IModel)
+        IModel.setTaggedValue('changed', True)
+        assert_that(schema_fingerprint(IModel), is_(first))
+        assert_that(schema_fingerprint(IModel, DefaultObjectJsonSchemaMaker()),
+                    is_not(first))
+        clear_fingerprint_cache()
+        assert_that(schema_fingerprint(IModel), is_not(first))
+
+    def test_round_trip(self):
+        maker = DefaultObjectJsonSchemaMaker()
+        assert_that(dump_snapshot(self.path, (ISnapshotted,), maker), is_(1))
+
+        loaded = DefaultObjectJsonSchemaMaker()
+        assert_that(load_snapshot(self.path, (ISnapshotted,), loaded),
+                    is_([]))
+        assert_that(loaded._snapshot_body(ISnapshotted),
+                    is_(maker.make_encoded_schema(ISnapshotted).body))
+        assert_that(loaded.make_schema(ISnapshotted),
+                    is_(maker.make_schema(ISnapshotted)))
+        assert_that(loaded.make_encoded_schema(ISnapshotted).body,
+                    is_(maker.make_encoded_schema(ISnapshotted).body))
+        assert_that(ensure_snapshot(self.path, (ISnapshotted,), loaded),
+                    is_(False))
+
+        # Batches use the installed schemas too
+        loaded.install_snapshot(ISnapshotted, b'{"Fields": {}}')
+        assert_that(loaded.make_schemas((ISnapshotted,)),
+                    is_({ISnapshotted: {'Fields': {}}}))
+
+    def test_stale(self):
+        class ISnapshotted(interface.Interface):  # pylint: disable=redefined-outer-name
+            abs = Number(title=u'changed')
+
+        maker = DefaultObjectJsonSchemaMaker()
+        dump_snapshot(self.path, (ISnapshotted,), maker)
+        # Same identifier, different definition
+        loaded = DefaultObjectJsonSchemaMaker()
+        stale = load_snapshot(self.path, [globals()['ISnapshotted']], loaded)
+        assert_that(stale, is_([globals()['ISnapshotted']]))
+        assert_that(ensure_snapshot(self.path, [globals()['ISnapshotted']], loaded),
+                    is_(True))
+        assert_that(load_snapshot(self.path, [globals()['ISnapshotted']], loaded),
+                    is_([]))
+
+    def test_unwanted(self):
+        class IOther(interface.Interface):
+            abs = Number()
+        maker = DefaultObjectJsonSchemaMaker()
+        assert_that(dump_snapshot(self.path, (ISnapshotted, IOther), maker),
+                    is_(2))
+        loaded = DefaultObjectJsonSchemaMaker()
+        assert_that(load_snapshot(self.path, (ISnapshotted,), loaded),
+                    is_([]))
+        assert_that(loaded._snapshot_body(IOther), is_(none()))
+
+    def test_invalid(self):
+        maker = DefaultObjectJsonSchemaMaker()
+        assert_that(ensure_snapshot(self.path, (ISnapshotted,), maker),
+                    is_(True))
+        with open(self.path, 'rb') as fp:
+            data = fp.read()
+        with open(self.path, 'wb') as fp:
+            fp.write(data[:-10])
+        assert_that(load_snapshot(self.path, (ISnapshotted,), maker),
+                    is_([ISnapshotted]))
+
+        with open(self.path, 'wb') as fp:
+            fp.write(zlib.compress(b'{"version":1,"hash":"","schemas":{}}'))
+        assert_that(load_snapshot(self.path, (ISnapshotted,), maker),
+                    is_([ISnapshotted]))
+
+    def test_unfingerprinted(self):
+        class IModel(interface.Interface):
+            abs = Number()
+        maker = DefaultObjectJsonSchemaMaker()
+        assert_that(dump_snapshot(self.path, (IModel,), maker), is_(1))
+        clear_fingerprint_cache()
+        IModel.setTaggedValue('marker', object())
+        assert_that(load_snapshot(self.path, (IModel,), maker), is_([IModel]))
+        assert_that(dump_snapshot(self.path, (IModel,), maker), is_(0))
+
+    def test_broken_maker(self):
+        class BrokenMaker(object):
+            def make_schema(self, unused_schema, unused_user=None):
+                raise TypeError()
+        assert_that(dump_snapshot(self.path, (ISnapshotted,), BrokenMaker()),
+                    is_(0))
+
+    def test_registered(self):
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(ISnapshotted, IInterface,
+                            name=ISnapshotted.__identifier__)
+        try:
+            assert_that(registered_schemas(), has_item(ISnapshotted))
+            maker = DefaultObjectJsonSchemaMaker()
+            dump_snapshot(self.path, maker=maker)
+            assert_that(load_snapshot(self.path, maker=maker),
+                        does_not(has_item(ISnapshotted)))
+        finally:
+            gsm.unregisterUtility(ISnapshotted, IInterface,
+                                  name=ISnapshotted.__identifier__)
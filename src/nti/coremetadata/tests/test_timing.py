@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods,inherit-non-class
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import is_not
+from hamcrest import has_key
+from hamcrest import has_length
+from hamcrest import has_entry
+from hamcrest import has_property
+from hamcrest import assert_that
+from hamcrest import has_entries
+from hamcrest import same_instance
+from hamcrest import greater_than_or_equal_to
+does_not = is_not
+
+from nti.testing.matchers import verifiably_provides
+
+import unittest
+
+from zope import interface
+
+from zope.schema import vocabulary
+
+from nti.coremetadata.interfaces import ISchemaTimingSink
+
+from nti.coremetadata.jsonschema import CoreJsonSchemafier
+from nti.coremetadata.jsonschema import DefaultObjectJsonSchemaMaker
+
+from nti.coremetadata.timing import LoggingTimingSink
+from nti.coremetadata.timing import TimingStatsCollector
+
+from nti.coremetadata.timing import timed_schemafier
+
+from nti.coremetadata.tests import SharedConfiguringTestLayer
+
+from nti.schema.field import Choice
+from nti.schema.field import Number
+from nti.schema.field import Object
+from nti.schema.field import Variant
+
+
+class ISpirit(interface.Interface):
+    pass
+
+
+class IModel(interface.Interface):
+    abs = Number()
+    spirit = Variant((Object(ISpirit), Number()))
+    choice = Choice(vocabulary=vocabulary.SimpleVocabulary.fromValues(('a', 'b')))
+
+
+class TestTiming(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def test_stats(self):
+        sink = TimingStatsCollector()
+        assert_that(sink, verifiably_provides(ISchemaTimingSink))
+        maker = DefaultObjectJsonSchemaMaker(sink=sink)
+        timed = maker.make_schema(IModel)
+        assert_that(timed, is_(DefaultObjectJsonSchemaMaker().make_schema(IModel)))
+
+        stats = sink.stats()
+        for phase in ('field', 'allow_field', 'ui_types', 'variant', 'choice'):
+            assert_that(stats, has_key(phase))
+        assert_that(stats,
+                    has_entry('field', has_entries('count', greater_than_or_equal_to(3))))
+        slowest = sink.slowest(limit=2)
+        assert_that(slowest, has_length(2))
+        assert_that(sink.slowest('variant'), has_length(1))
+        sink.clear()
+        assert_that(sink.stats(), is_({}))
+
+    def test_timed_class(self):
+        factory = timed_schemafier(CoreJsonSchemafier)
+        assert_that(timed_schemafier(CoreJsonSchemafier), is_(same_instance(factory)))
+        # Without a sink nothing is recorded
+        schemafier = factory(IModel)
+        assert_that(schemafier, has_property('sink', none()))
+        assert_that(schemafier._timed('field', 'abs', len, u'ab'), is_(2))
+        schema = schemafier.make_schema()
+        assert_that(schema, is_(CoreJsonSchemafier(IModel).make_schema()))
+
+    def test_logging(self):
+        messages = []
+
+        class Log(object):
+            def log(self, *args):
+                messages.append(args)
+        sink = LoggingTimingSink(Log())
+        DefaultObjectJsonSchemaMaker(sink=sink).make_schema(IModel)
+        assert_that(messages, is_not([]))
+        assert_that(LoggingTimingSink().log, is_not(None))
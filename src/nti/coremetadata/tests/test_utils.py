@@ -9,7 +9,11 @@ from __future__ import absolute_import
 
 from hamcrest import is_
 from hamcrest import is_not
+from hamcrest import has_key
+from hamcrest import has_entry
+from hamcrest import has_entries
 from hamcrest import assert_that
+from hamcrest import same_instance
 from hamcrest import has_property
 does_not = is_not
 
@@ -20,13 +24,23 @@ from zope import interface
 
 from zope.security.management import system_user
 
+from nti.base.interfaces import ILastModified
+
 from nti.coremetadata.interfaces import IObjectJsonSchemaMaker
 
 from nti.coremetadata.utils import make_schema
+from nti.coremetadata.utils import make_schemas
+from nti.coremetadata.utils import make_lazy_schema
+from nti.coremetadata.utils import make_encoded_schema
 from nti.coremetadata.utils import current_principal
+from nti.coremetadata.utils import clear_schema_cache
+from nti.coremetadata.utils import schema_cache_stats
 
 from nti.coremetadata.tests import SharedConfiguringTestLayer
 
+from nti.schema.field import Number
+from nti.schema.field import TextLine
+
 
 class TestUtils(unittest.TestCase):
 
@@ -55,3 +69,129 @@ class TestUtils(unittest.TestCase):
                                                                IObjectJsonSchemaMaker)
             component.getGlobalSiteManager().registerUtility(old_maker,
                                                              IObjectJsonSchemaMaker)
+
+    def test_make_schema_cache(self):
+        class IModel(ILastModified):
+            abs = Number()
+
+        clear_schema_cache()
+        stats = schema_cache_stats()
+        first = make_schema(IModel)
+        assert_that(first, has_entry('Fields', has_key('abs')))
+        # callers get a private copy
+        first['Fields'].clear()
+        second = make_schema(IModel)
+        assert_that(second, has_entry('Fields', has_key('abs')))
+        assert_that(schema_cache_stats(),
+                    has_entries('hits', stats['hits'] + 1,
+                                'misses', stats['misses'] + 1))
+
+        # the default maker ignores the user
+        make_schema(IModel, user=system_user)
+        assert_that(schema_cache_stats(),
+                    has_entries('hits', stats['hits'] + 2))
+
+        encoded = make_encoded_schema(IModel, user=system_user)
+        assert_that(make_encoded_schema(IModel), is_(same_instance(encoded)))
+
+    def test_make_schemas(self):
+        class IModel(ILastModified):
+            abs = Number()
+
+        class IFaked(interface.Interface):
+            pass
+        IFaked.setTaggedValue('_ext_jsonschema', u'fake')
+
+        class IOther(ILastModified):
+            name = TextLine()
+
+        @interface.implementer(IObjectJsonSchemaMaker)
+        class FakeMaker(object):
+            def make_schema(self, unused_schema, user=None):
+                return {'user': user}
+
+        batches = []
+
+        @interface.implementer(IObjectJsonSchemaMaker)
+        class FakeBatchMaker(FakeMaker):
+            cacheable = True
+
+            def make_schemas(self, schemas, user=None):
+                batches.append(user)
+                return {x: {'user': user} for x in schemas}
+
+        schema_maker = FakeMaker()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        try:
+            # Makers without make_schemas make each schema
+            result = make_schemas((IModel, IFaked), user=u'ichigo')
+        finally:
+            gsm.unregisterUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        assert_that(result, has_entry(IFaked, {'user': u'ichigo'}))
+        assert_that(result, has_entry(IModel, is_(make_schema(IModel))))
+
+        # Batches are cached, and only the misses are made
+        clear_schema_cache()
+        make_schema(IModel)
+        stats = schema_cache_stats()
+        result = make_schemas((IModel, IOther), user=u'ichigo')
+        assert_that(schema_cache_stats(),
+                    has_entries('hits', stats['hits'] + 1,
+                                'misses', stats['misses'] + 1,
+                                'size', 2))
+        assert_that(result, has_entry(IOther, is_(make_schema(IOther))))
+        result[IOther]['Fields'].clear()
+        assert_that(make_schemas((IModel, IOther)),
+                    is_({IModel: make_schema(IModel), IOther: make_schema(IOther)}))
+        assert_that(make_schema(IOther)['Fields'], has_key('name'))
+
+        # Makers depending on the user are not cached for a user
+        schema_maker = FakeBatchMaker()
+        gsm.registerUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        try:
+            result = make_schemas((IFaked,), user=u'ichigo')
+            assert_that(result, is_({IFaked: {'user': u'ichigo'}}))
+            make_schemas((IFaked,))
+            result = make_schemas((IFaked,))
+            assert_that(result, is_({IFaked: {'user': None}}))
+            # Nor are makers that do not declare they are cacheable
+            schema_maker.cacheable = False
+            make_schemas((IFaked,))
+        finally:
+            gsm.unregisterUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        assert_that(batches, is_([u'ichigo', None, None]))
+
+    def test_make_schema_cache_invalidated(self):
+        calls = []
+
+        @interface.implementer(IObjectJsonSchemaMaker)
+        class FakeMaker(object):
+            def make_schema(self, unused_schema, user=None):
+                calls.append(user)
+                return {}
+        schema_maker = FakeMaker()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        try:
+            # Makers are not cached unless they declare it
+            make_schema(interface.Interface, name=u'fake')
+            make_schema(interface.Interface, name=u'fake')
+            assert_that(calls, is_([None, None]))
+            assert_that(schema_cache_stats(), has_entry('size', 0))
+            schema_maker.cacheable = True
+            make_schema(interface.Interface, name=u'fake')
+            make_schema(interface.Interface, name=u'fake')
+            assert_that(calls, is_([None, None, None]))
+            # Makers are assumed to depend on the user
+            make_schema(interface.Interface, user=u'ichigo', name=u'fake')
+            assert_that(calls, is_([None, None, None, u'ichigo']))
+            # Makers without encoding support are encoded for them
+            encoded = make_encoded_schema(interface.Interface, name=u'fake')
+            assert_that(encoded.body, is_(b'{}'))
+            assert_that(make_lazy_schema(interface.Interface, name=u'fake'),
+                        is_({}))
+        finally:
+            gsm.unregisterUtility(schema_maker, IObjectJsonSchemaMaker, name=u'fake')
+        # Registration events clear the cache
+        assert_that(schema_cache_stats(), has_entry('size', 0))
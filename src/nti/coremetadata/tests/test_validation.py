@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods,inherit-non-class
+
+from hamcrest import is_
+from hamcrest import contains
+from hamcrest import has_length
+from hamcrest import instance_of
+from hamcrest import same_instance
+from hamcrest import is_not
+from hamcrest import raises
+from hamcrest import calling
+from hamcrest import assert_that
+does_not = is_not
+
+import unittest
+
+from zope import interface
+
+from zope.schema import Set
+from zope.schema import Text
+
+from zope.schema.interfaces import WrongType
+from zope.schema.interfaces import RequiredMissing
+from zope.schema.interfaces import ValidationError
+
+from nti.coremetadata.interfaces import IContained
+from nti.coremetadata.interfaces import IEmbeddedLink
+from nti.coremetadata.interfaces import ITaggedContent
+from nti.coremetadata.interfaces import checkCannotBeBlank
+from nti.coremetadata.interfaces import FieldCannotBeOnlyWhitespace
+
+from nti.coremetadata.validation import validate_values
+from nti.coremetadata.validation import compile_validator
+from nti.coremetadata.validation import schema_validators
+
+from nti.coremetadata.tests import SharedConfiguringTestLayer
+
+from nti.schema.field import Int
+from nti.schema.field import Bool
+from nti.schema.field import Float
+from nti.schema.field import Number
+from nti.schema.field import Object
+from nti.schema.field import TextLine
+from nti.schema.field import ValidTextLine
+from nti.schema.field import TupleFromObject
+from nti.schema.field import DecodingValidTextLine
+
+VALUES = (None, u'', u'a', u'abc', u'a\nb', b'abc', 0, 0.0, 1, 2.5, -1,
+          True, False, (), (u'a',), (u'a', u'a'), [u'a'], (1, 2),
+          (u'a\nb',), {u'a'}, object())
+
+
+class IThing(interface.Interface):
+    pass
+
+
+class IRecord(interface.Interface):
+    name = ValidTextLine(constraint=checkCannotBeBlank)
+    count = Number(required=False)
+    flag = Bool()
+
+    def method():
+        "Not a field"
+
+
+class TestValidation(unittest.TestCase):
+
+    layer = SharedConfiguringTestLayer
+
+    def _error(self, func, value):
+        try:
+            func(value)
+        except (ValidationError, TypeError) as e:
+            return type(e), e.args
+        return None
+
+    def _check(self, field, inline=True):
+        validator = compile_validator(field)
+        assert_that(validator.inline, is_(inline))
+        for value in VALUES:
+            expected = self._error(field.validate, value)
+            assert_that(self._error(validator, value), is_(expected), value)
+            bound = self._error(lambda v: validator(v, object()), value)
+            assert_that(bound, is_(expected), value)
+
+    def test_text_lines(self):
+        self._check(TextLine())
+        self._check(ValidTextLine(required=False, min_length=1, max_length=2))
+        self._check(DecodingValidTextLine(required=False))
+        self._check(IContained['id'])
+
+    def test_others(self):
+        self._check(Bool())
+        self._check(Bool(required=False))
+        self._check(Number(min=0, max=2))
+        self._check(TupleFromObject(value_type=ValidTextLine(),
+                                    min_length=1, required=False))
+        self._check(TupleFromObject(value_type=Number()))
+        self._check(TupleFromObject())
+
+    def test_required_missing_value(self):
+        # A required field rejects its missing value even if its type is valid
+        for field in (Int(missing_value=0, default=1),
+                      TextLine(missing_value=u''),
+                      Float(missing_value=0.0, default=1.0),
+                      TupleFromObject(value_type=TextLine(missing_value=u''))):
+            self._check(field)
+        validator = compile_validator(Int(missing_value=0, default=1))
+        assert_that(calling(validator).with_args(0), raises(RequiredMissing))
+        validator = compile_validator(Float(missing_value=0.0, default=1.0))
+        assert_that(calling(validator).with_args(0.0), raises(RequiredMissing))
+        validator = compile_validator(TextLine(missing_value=u''))
+        assert_that(calling(validator).with_args(u''), raises(RequiredMissing))
+        self._check(Int(required=False, missing_value=0, default=1))
+
+    def test_not_inline(self):
+        self._check(Text(), inline=False)
+        self._check(TextLine(constraint=lambda x: x != u'a'), inline=False)
+        self._check(Set(), inline=False)
+        self._check(TupleFromObject(value_type=Object(IThing)), inline=False)
+        self._check(TupleFromObject(unique=True), inline=False)
+        self._check(ITaggedContent['tags'], inline=False)
+
+    def test_validate_values(self):
+        assert_that(schema_validators(IRecord),
+                    is_(same_instance(schema_validators(IRecord))))
+        assert_that(validate_values(IRecord, {'name': u'a', 'flag': True,
+                                              'other': 1}),
+                    is_([]))
+
+        errors = validate_values(IRecord, {'name': u'  ', 'count': u'1'})
+        assert_that([name for name, _ in errors],
+                    contains('name', 'count', 'flag'))
+        assert_that(errors[0][1], instance_of(FieldCannotBeOnlyWhitespace))
+        assert_that(errors[1][1], instance_of(WrongType))
+        assert_that(errors[2][1], instance_of(RequiredMissing))
+
+        assert_that(validate_values(IRecord, {}, partial=True), is_([]))
+
+    def test_validate_interface(self):
+        errors = validate_values(IEmbeddedLink,
+                                 {'embedURL': u'http://example.com',
+                                  'imageURL': 1},
+                                 partial=True)
+        assert_that(errors, has_length(1))
+        assert_that(errors[0][0], is_('imageURL'))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing instrumentation for JSON schema generation.
+
+Schemafiers are only instrumented when a sink is given (see
+:func:`timed_schemafier` and
+:class:`nti.coremetadata.jsonschema.DefaultObjectJsonSchemaMaker`),
+so there is no cost when it is disabled. Timings of the phases are
+inclusive: the time of ``ui_types`` contains that of any ``variant``
+or ``choice`` processing it triggers.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import logging
+import threading
+
+from zope import interface
+
+from nti.coremetadata.interfaces import ISchemaTimingSink
+
+try:
+    from time import perf_counter as _timer
+except ImportError:  # pragma: no cover Python 2
+    from time import time as _timer
+
+#: A field schema was built
+PHASE_FIELD = 'field'
+
+#: A field was checked by ``allow_field``
+PHASE_ALLOW_FIELD = 'allow_field'
+
+#: The UI types of a field were computed
+PHASE_UI_TYPES = 'ui_types'
+
+#: The base types of a variant were resolved
+PHASE_VARIANT = 'variant'
+
+#: The choices of a choice field were processed
+PHASE_CHOICE = 'choice'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+@interface.implementer(ISchemaTimingSink)
+class LoggingTimingSink(object):
+    """
+    Log every timing.
+    """
+
+    def __init__(self, log=None, level=logging.DEBUG):
+        self.log = log if log is not None else logger
+        self.level = level
+
+    def record(self, phase, name, elapsed):
+        self.log.log(self.level, "Schema %s of %r took %.6fs",
+                     phase, name, elapsed)
+
+
+@interface.implementer(ISchemaTimingSink)
+class TimingStatsCollector(object):
+    """
+    Aggregate call counts and total times by phase and by
+    phase and field name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.fields = {}
+
+    @staticmethod
+    def _add(data, key, elapsed):
+        count, total = data.get(key, (0, 0.0))
+        data[key] = (count + 1, total + elapsed)
+
+    def record(self, phase, name, elapsed):
+        with self._lock:
+            self._add(self.phases, phase, elapsed)
+            self._add(self.fields, (phase, name), elapsed)
+
+    def slowest(self, phase=PHASE_FIELD, limit=10):
+        """
+        Return the ``(name, count, total)`` of the fields that took
+        the most time in the phase.
+        """
+        with self._lock:
+            result = [(name, count, total)
+                      for (p, name), (count, total) in self.fields.items()
+                      if p == phase]
+        result.sort(key=lambda x: x[2], reverse=True)
+        return result[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                phase: {'count': count, 'total': total}
+                for phase, (count, total) in self.phases.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self.phases.clear()
+            self.fields.clear()
+
+
+class TimedSchemafierMixin(object):
+    """
+    Report the time spent in the phases of a
+    :class:`nti.schema.jsonschema.JsonSchemafier` to a
+    :class:`.ISchemaTimingSink`.
+    """
+
+    sink = None
+
+    def __init__(self, schema, *args, **kwargs):
+        sink = kwargs.pop('sink', None)
+        super(TimedSchemafierMixin, self).__init__(schema, *args, **kwargs)
+        if sink is not None:
+            self.sink = sink
+
+    def _timed(self, phase, name, func, *args):
+        sink = self.sink
+        if sink is None:
+            return func(*args)
+        start = _timer()
+        try:
+            return func(*args)
+        finally:
+            sink.record(phase, name, _timer() - start)
+
+    def _make_field_schema(self, field, name=None):
+        sup = super(TimedSchemafierMixin, self)._make_field_schema
+        return self._timed(PHASE_FIELD, name or field.__name__,
+                           sup, field, name)
+
+    def allow_field(self, name, field):
+        sup = super(TimedSchemafierMixin, self).allow_field
+        return self._timed(PHASE_ALLOW_FIELD, name, sup, name, field)
+
+    def get_ui_types_from_field(self, field):
+        sup = super(TimedSchemafierMixin, self).get_ui_types_from_field
+        return self._timed(PHASE_UI_TYPES, field.__name__, sup, field)
+
+    def process_variant(self, field, ui_type):
+        sup = super(TimedSchemafierMixin, self).process_variant
+        return self._timed(PHASE_VARIANT, field.__name__, sup, field, ui_type)
+
+    def get_data_from_choice_field(self, field, base_type=None):
+        sup = super(TimedSchemafierMixin, self).get_data_from_choice_field
+        return self._timed(PHASE_CHOICE, field.__name__, sup, field, base_type)
+
+
+_timed_classes = {}
+
+
+def timed_schemafier(factory):
+    """
+    Return a subclass of the given schemafier class that accepts a
+    ``sink`` argument and reports its timings to it.
+    """
+    try:
+        return _timed_classes[factory]
+    except KeyError:
+        pass
+    result = type('Timed' + factory.__name__,
+                  (TimedSchemafierMixin, factory),
+                  {'__module__': __name__})
+    return _timed_classes.setdefault(factory, result)
@@ -8,6 +8,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import copy
+
 from zope import component
 from zope import deferredimport
 
@@ -16,8 +18,18 @@ from zope.security.management import getInteraction
 
 from zope.security.management import system_user
 
+from nti.coremetadata.cache import IdentityCache
+
 from nti.coremetadata.interfaces import IObjectJsonSchemaMaker
 
+from nti.coremetadata.jsonschema import EncodedSchema
+
+from nti.coremetadata.jsonschema import encode_schema
+from nti.coremetadata.jsonschema import clear_caches as clear_jsonschema_caches
+
+#: Maximum number of schemas kept by :func:`make_schema`
+SCHEMA_CACHE_SIZE = 512
+
 logger = __import__('logging').getLogger(__name__)
 
 
@@ -30,13 +42,154 @@ def current_principal(system=True):
 currentPrincipal = current_principal
 
 
+_schema_cache = IdentityCache(SCHEMA_CACHE_SIZE)
+
+
+def _is_user_sensitive(schemafier, user):
+    # Makers that do not declare otherwise are assumed to customize
+    # their output for the given user
+    return user is not None and getattr(schemafier, 'user_sensitive', True)
+
+
+def _is_cacheable(schemafier, user):
+    # Only makers that declare it may be cached, and only for users
+    # they do not customize their output for
+    return     getattr(schemafier, 'cacheable', False) \
+           and not _is_user_sensitive(schemafier, user)
+
+
+def _for_user(schemafier, result, schema, user):
+    overlay = getattr(schemafier, 'overlay_schema', None)
+    if user is not None and overlay is not None:
+        result = overlay(result, schema, user)
+    return result
+
+
 def make_schema(schema, user=None, maker=IObjectJsonSchemaMaker, name=u''):
+    """
+    Create the JSON schema for the given zope schema using the
+    registered ``maker`` utility.
+
+    The results of utilities that set ``cacheable`` to True are
+    cached by schema, maker, resolved utility name and utility; every
+    call returns a private copy. Those that produce user specific
+    output (those that do not set ``user_sensitive`` to False) are not
+    cached when a user is given. Those that do set it may provide an
+    ``overlay_schema(result, schema, user)`` method that is applied to
+    a copy of the cached, user independent, schema. Other utilities are
+    called each time.
+    """
     name = schema.queryTaggedValue('_ext_jsonschema') or name
     schemafier = component.getUtility(maker, name=name)
-    result = schemafier.make_schema(schema, user)
+    if not _is_cacheable(schemafier, user):
+        return schemafier.make_schema(schema, user)
+    objects = (schema, maker, schemafier)
+    result = _schema_cache.lookup(objects, name)
+    if result is not None:
+        result = copy.deepcopy(result)
+    else:
+        result = schemafier.make_schema(schema)
+        _schema_cache.store(objects, copy.deepcopy(result), name)
+    return _for_user(schemafier, result, schema, user)
+
+
+def make_schemas(schemas, user=None, maker=IObjectJsonSchemaMaker, name=u''):
+    """
+    Create the JSON schemas for several zope schemas, returning a
+    mapping from each schema to its JSON schema.
+
+    Schemas are cached like in :func:`make_schema`. Those not cached
+    that are made by the same ``maker`` utility are made at once by its
+    ``make_schemas`` method, if it has one; the others are made one at
+    a time by :func:`make_schema`.
+    """
+    result = {}
+    batches = {}
+    for schema in schemas:
+        schema_name = schema.queryTaggedValue('_ext_jsonschema') or name
+        schemafier = component.getUtility(maker, name=schema_name)
+        if not hasattr(schemafier, 'make_schemas'):
+            result[schema] = make_schema(schema, user, maker, name)
+            continue
+        if _is_cacheable(schemafier, user):
+            item = _schema_cache.lookup((schema, maker, schemafier), schema_name)
+            if item is not None:
+                item = copy.deepcopy(item)
+                result[schema] = _for_user(schemafier, item, schema, user)
+                continue
+        batch = batches.setdefault(id(schemafier), (schemafier, []))
+        batch[1].append((schema, schema_name))
+    for schemafier, batch in batches.values():
+        if not _is_cacheable(schemafier, user):
+            result.update(schemafier.make_schemas([x for x, _ in batch], user))
+            continue
+        made = schemafier.make_schemas([x for x, _ in batch])
+        for schema, schema_name in batch:
+            item = made[schema]
+            _schema_cache.store((schema, maker, schemafier),
+                                copy.deepcopy(item), schema_name)
+            result[schema] = _for_user(schemafier, item, schema, user)
     return result
 
 
+def make_encoded_schema(schema, user=None, maker=IObjectJsonSchemaMaker, name=u''):
+    """
+    Like :func:`make_schema`, but return a
+    :class:`nti.coremetadata.jsonschema.EncodedSchema` holding the
+    JSON bytes and their ETag, suitable for writing directly to a
+    response.
+    """
+    name = schema.queryTaggedValue('_ext_jsonschema') or name
+    schemafier = component.getUtility(maker, name=name)
+    if      not _is_user_sensitive(schemafier, user) \
+        and hasattr(schemafier, 'make_encoded_schema'):
+        return schemafier.make_encoded_schema(schema, user)
+    result = make_schema(schema, user, maker, name)
+    return EncodedSchema(encode_schema(result))
+
+
+def make_lazy_schema(schema, user=None, maker=IObjectJsonSchemaMaker, name=u''):
+    """
+    Like :func:`make_schema`, but where the maker supports it, the
+    schemas of the fields are only built when they are accessed. Use
+    this when only a few fields are needed, for example to validate
+    a partial update.
+    """
+    name = schema.queryTaggedValue('_ext_jsonschema') or name
+    schemafier = component.getUtility(maker, name=name)
+    if not hasattr(schemafier, 'make_lazy_schema'):
+        return make_schema(schema, user, maker, name)
+    return schemafier.make_lazy_schema(schema, user)
+
+
+def schema_cache_stats():
+    """
+    Return the hit/miss statistics of the :func:`make_schema` cache.
+    """
+    return _schema_cache.stats()
+
+
+def clear_schema_cache():
+    _schema_cache.clear()
+
+
+def _registration_changed(unused_event=None):
+    """
+    Component registrations changed; the utilities making our
+    schemas (or the vocabularies they use) may be different now.
+    """
+    clear_schema_cache()
+    clear_jsonschema_caches()
+
+
+try:
+    from zope.testing.cleanup import addCleanUp
+except ImportError:  # pragma: no cover
+    pass
+else:
+    addCleanUp(clear_schema_cache)
+
+
 # deprecations
 
 
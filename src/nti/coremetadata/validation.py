@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compiled field validators.
+
+:func:`compile_validator` turns a schema field into a function
+that validates values like the field's ``validate`` method. Text
+lines, booleans, numbers and sequences of them are checked inline;
+any value those checks cannot accept, and every value of other
+kinds of fields, is validated by the field itself, so the results
+and errors are always those of the field.
+
+:func:`validate_values` validates many proposed values for an
+interface at once with the compiled validators of its fields.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from zope.schema import getFieldsInOrder
+
+from zope.schema._bootstrapfields import Bool
+from zope.schema._bootstrapfields import Field
+from zope.schema._bootstrapfields import TextLine
+from zope.schema._bootstrapfields import Iterable
+from zope.schema._bootstrapfields import Container
+from zope.schema._bootstrapfields import MinMaxLen
+from zope.schema._bootstrapfields import Orderable
+
+from zope.schema._field import Collection
+
+from zope.schema.interfaces import RequiredMissing
+from zope.schema.interfaces import ValidationError
+
+from nti.coremetadata.cache import IdentityCache
+
+from nti.schema.field import TupleFromObject
+from nti.schema.field import FieldValidationMixin
+from nti.schema.field import DecodingValidTextLine
+
+#: Maximum number of interfaces whose compiled fields are kept
+SCHEMA_PLAN_CACHE_SIZE = 1024
+
+logger = __import__('logging').getLogger(__name__)
+
+#: The methods whose implementations determine what a field accepts
+_VALIDATION_METHODS = ('validate', '_validate', 'constraint')
+
+# The classes that may implement the validation methods of each kind
+# of field we check inline. FieldValidationMixin only changes errors;
+# the DecodingValidTextLine and TupleFromObject ``validate`` only
+# convert values (bytes, lists) that we do not accept inline.
+_BASE_CLASSES = frozenset((Field, FieldValidationMixin))
+
+_TEXT_LINE_CLASSES = _BASE_CLASSES | frozenset((MinMaxLen,
+                                               TextLine,
+                                               DecodingValidTextLine))
+
+_BOOL_CLASSES = _BASE_CLASSES | frozenset((Bool,))
+
+_ORDERABLE_CLASSES = _BASE_CLASSES | frozenset((Orderable,))
+
+_SEQUENCE_CLASSES = _BASE_CLASSES | frozenset((MinMaxLen,
+                                              Iterable,
+                                              Container,
+                                              Collection,
+                                              TupleFromObject))
+
+
+def _implemented_by(field, classes):
+    if any(name in field.__dict__ for name in _VALIDATION_METHODS):
+        return False  # e.g. a constraint given to the constructor
+    for cls in type(field).__mro__:
+        if     any(name in cls.__dict__ for name in _VALIDATION_METHODS) \
+           and cls not in classes:
+            return False
+    return True
+
+
+def _with_missing(field, check):
+    # Like Field.validate, the missing value is valid unless the field
+    # is required, and then it is RequiredMissing, whatever its type
+    missing = field.missing_value
+    if field.required:
+        def checked(value):
+            return not value == missing and check(value)
+    else:
+        def checked(value):
+            return value == missing or check(value)
+    return checked
+
+
+def _length_ok(field):
+    min_length = field.min_length
+    max_length = field.max_length
+
+    def check(value):
+        size = len(value)
+        return (min_length is None or size >= min_length) \
+           and (max_length is None or size <= max_length)
+    return check
+
+
+def _text_line_check(field):
+    kind = field._type
+    length_ok = _length_ok(field)
+
+    def check(value):
+        if isinstance(value, kind) and type(value) is not bytes:
+            return '\n' not in value and '\r' not in value and length_ok(value)
+        return False
+    return check
+
+
+def _bool_check(unused_field):
+
+    def check(value):
+        return value is True or value is False
+    return check
+
+
+def _orderable_check(field):
+    kind = field._type
+    low = field.min
+    high = field.max
+
+    def check(value):
+        if kind is not None and isinstance(value, kind):
+            return (low is None or value >= low) \
+               and (high is None or value <= high)
+        return False
+    return check
+
+
+def _sequence_check(field):
+    if field.unique or not isinstance(field._type, (type, tuple)):
+        return None
+    kind = field._type
+    length_ok = _length_ok(field)
+    item_check = None
+    if field.value_type is not None:
+        item_check = _compile_check(field.value_type)
+        if item_check is None:
+            return None
+
+    def check(value):
+        if type(value) in (tuple, list) and isinstance(value, kind):
+            if not length_ok(value):
+                return False
+            if item_check is not None:
+                for item in value:
+                    if not item_check(item):
+                        return False
+            return True
+        return False
+    return check
+
+
+_COMPILERS = (
+    (_TEXT_LINE_CLASSES, TextLine, _text_line_check),
+    (_BOOL_CLASSES, Bool, _bool_check),
+    (_ORDERABLE_CLASSES, Orderable, _orderable_check),
+    (_SEQUENCE_CLASSES, Collection, _sequence_check),
+)
+
+
+def _compile_check(field):
+    """
+    Return a function that returns True only for values the field
+    accepts, or None if we cannot check the field inline.
+    """
+    for classes, base, compiler in _COMPILERS:
+        if isinstance(field, base) and _implemented_by(field, classes):
+            check = compiler(field)
+            return _with_missing(field, check) if check is not None else None
+    return None
+
+
+def compile_validator(field):
+    """
+    Return a function taking a value and an optional context that
+    validates the value like ``field.bind(context).validate(value)``.
+    """
+    check = _compile_check(field)
+
+    def validator(value, context=None):
+        if check is None or not check(value):
+            bound = field.bind(context) if context is not None else field
+            bound.validate(value)
+    validator.inline = check is not None
+    return validator
+
+
+_marker = object()
+
+_schema_plans = IdentityCache(SCHEMA_PLAN_CACHE_SIZE)
+
+
+def schema_validators(schema):
+    """
+    Return the ``(name, field, validator)`` of each field of the
+    interface, in order, computed once per interface.
+    """
+    plan = _schema_plans.lookup((schema,))
+    if plan is None:
+        plan = tuple((name, field, compile_validator(field))
+                     for name, field in getFieldsInOrder(schema))
+        _schema_plans.store((schema,), plan)
+    return plan
+
+
+def validate_values(schema, values, context=None, partial=False):
+    """
+    Validate a mapping of proposed attribute values against the fields
+    of the interface, in one pass.
+
+    Required fields without a value are reported as missing unless
+    *partial* is true. Keys that are not fields are ignored.
+
+    :return: A list of the ``(name, error)`` of each invalid value,
+        in the order of the fields; empty if all values are valid.
+    """
+    errors = []
+    for name, field, validator in schema_validators(schema):
+        value = values.get(name, _marker)
+        if value is _marker:
+            if field.required and not partial:
+                error = RequiredMissing(name).with_field_and_value(field, None)
+                errors.append((name, error))
+            continue
+        try:
+            validator(value, context)
+        except ValidationError as e:
+            errors.append((name, e))
+    return errors